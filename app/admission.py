@@ -0,0 +1,166 @@
+"""
+Memory-aware admission control for image inference
+
+Peak memory of a blood check is dominated by per-pixel buffers at the input
+resolution: SAM upsamples every batch of mask logits (points_per_batch x 3
+float32 masks) to the original size, and we keep a few copies of the image.
+The estimate is taken from header dimensions before anything is decoded;
+large inputs are downscaled, absurd ones rejected, and concurrent jobs wait
+for room in a per-process memory budget.
+"""
+import math
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Tuple
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from .config import (
+    ADMISSION_MAX_PIXELS, ADMISSION_REJECT_PIXELS, MEMORY_BUDGET_MB,
+    ADMISSION_TIMEOUT, SAM_POINTS_PER_BATCH
+)
+from .metrics import registry, Counter, Gauge
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+ADMISSION_DECISIONS = registry.register(Counter(
+    "sawtna_admission_total", "Image inference admission decisions", ["outcome"]
+))
+MEMORY_RESERVED = registry.register(Gauge(
+    "sawtna_memory_reserved_bytes", "Estimated memory reserved by running image jobs"
+))
+
+# Fixed cost of a SAM pass at its 1024px input (model activations, embeddings)
+SAM_BASE_BYTES = 600 * 1024 * 1024
+# Decoded BGR + RGB copy + overlay/redaction output
+IMAGE_COPY_BYTES_PER_PIXEL = 3 * 3
+# Smallest image worth running SAM on after downscaling
+MIN_PIXELS = 512 * 512
+
+
+class AdmissionRejected(Exception):
+    """The image can't be processed within the limits; ``status_code`` is the HTTP status to return"""
+
+    def __init__(self, message: str, status_code: int = 413):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def estimate_bytes(width: int, height: int, points_per_batch: int = SAM_POINTS_PER_BATCH) -> int:
+    """Peak memory estimate of one blood check at the given resolution"""
+    pixels = width * height
+    # float32 logits plus the bool threshold of each upsampled mask in a batch
+    sam_bytes_per_pixel = points_per_batch * 3 * (4 + 1)
+    return SAM_BASE_BYTES + pixels * (IMAGE_COPY_BYTES_PER_PIXEL + sam_bytes_per_pixel)
+
+
+class MemoryBudget:
+    """Counting semaphore over estimated bytes"""
+
+    def __init__(self, total_bytes: int):
+        self.total_bytes = total_bytes
+        self.reserved = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, amount: int, timeout: float) -> bool:
+        amount = min(amount, self.total_bytes)
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.reserved + amount <= self.total_bytes, timeout):
+                return False
+            self.reserved += amount
+            MEMORY_RESERVED.set(self.reserved)
+            return True
+
+    def release(self, amount: int):
+        amount = min(amount, self.total_bytes)
+        with self._condition:
+            self.reserved -= amount
+            MEMORY_RESERVED.set(self.reserved)
+            self._condition.notify_all()
+
+
+memory_budget = MemoryBudget(MEMORY_BUDGET_MB * 1024 * 1024)
+
+
+def plan_scale(width: int, height: int) -> float:
+    """
+    Downscale factor (<= 1) that keeps one job under the pixel cap and budget
+
+    Raises:
+        AdmissionRejected: Too large to accept at all, or wouldn't fit even downscaled
+    """
+    pixels = width * height
+    if pixels > ADMISSION_REJECT_PIXELS:
+        raise AdmissionRejected(f"Image too large ({width}x{height}, max {ADMISSION_REJECT_PIXELS} pixels)")
+
+    target_pixels = min(pixels, ADMISSION_MAX_PIXELS)
+    per_pixel = estimate_bytes(1, 1) - SAM_BASE_BYTES
+    affordable = (memory_budget.total_bytes - SAM_BASE_BYTES) // per_pixel
+    target_pixels = min(target_pixels, affordable)
+    if target_pixels < min(pixels, MIN_PIXELS):
+        raise AdmissionRejected("Image can't be processed within the memory budget", status_code=503)
+    return min(1.0, math.sqrt(target_pixels / pixels))
+
+
+@contextmanager
+def admit(width: int, height: int, timeout: float = ADMISSION_TIMEOUT):
+    """
+    Reserve budget for a job at the given (already planned) resolution
+
+    Waiting for budget blocks the calling thread, so call this from worker
+    threads only, never from a coroutine on the event loop.
+
+    Raises:
+        AdmissionRejected: The budget didn't free up within ``timeout`` (503)
+    """
+    amount = estimate_bytes(width, height)
+    if not memory_budget.acquire(amount, timeout):
+        ADMISSION_DECISIONS.inc(outcome="rejected")
+        raise AdmissionRejected("Server busy, try again later", status_code=503)
+    try:
+        yield
+    finally:
+        memory_budget.release(amount)
+
+
+def header_size(source) -> Tuple[int, int]:
+    """(width, height) from the image header only; ``source`` is a path or file object"""
+    with Image.open(source) as image:
+        return image.size
+
+
+def decode_rgb(source, scale: float = 1.0) -> np.ndarray:
+    """
+    Decode to an RGB array, downscaled by ``scale``
+
+    JPEGs are decoded at a reduced DCT scale first, so large photos are never
+    materialised at full resolution.
+    """
+    with Image.open(source) as image:
+        target = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+        if scale < 1.0 and image.format == "JPEG":
+            image.draft("RGB", target)
+        decoded_size = image.size
+        # Match cv2.imread, which applies the EXIF orientation
+        image = ImageOps.exif_transpose(image).convert("RGB")
+    if image.size != decoded_size:
+        target = target[::-1]
+    if image.size != target:
+        image = image.resize(target, Image.BILINEAR)
+    return np.asarray(image)
+
+
+def plan(width: int, height: int) -> float:
+    """plan_scale plus decision accounting"""
+    try:
+        scale = plan_scale(width, height)
+    except AdmissionRejected:
+        ADMISSION_DECISIONS.inc(outcome="rejected")
+        raise
+    ADMISSION_DECISIONS.inc(outcome="downscaled" if scale < 1.0 else "admitted")
+    if scale < 1.0:
+        logger.info(f"Downscaling {width}x{height} by {scale:.3f} for admission")
+    return scale
@@ -0,0 +1,68 @@
+"""
+Frame sampling for animated GIF/WebP images
+
+Frames are decoded lazily and yielded in order, so a consumer that stops
+iterating (e.g. after a flagged frame) stops decoding the rest of the file.
+"""
+import logging
+from typing import Iterator, Tuple
+
+import numpy as np
+from PIL import Image, ImageSequence
+
+from .config import ANIMATION_MAX_FRAMES, ANIMATION_SAMPLING, ANIMATION_SCENE_THRESHOLD
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+SAMPLING_STRATEGIES = ("uniform", "scene")
+
+
+def is_animated(image: Image.Image) -> bool:
+    return bool(getattr(image, "is_animated", False)) and getattr(image, "n_frames", 1) > 1
+
+
+def uniform_indices(frame_count: int, max_frames: int):
+    """Evenly spaced frame indices, always including the first and last frame"""
+    if frame_count <= max_frames:
+        return list(range(frame_count))
+    return sorted(set(np.linspace(0, frame_count - 1, max_frames).round().astype(int).tolist()))
+
+
+def _signature(frame: Image.Image) -> np.ndarray:
+    return np.asarray(frame.convert("L").resize((32, 32)), dtype=np.float32)
+
+
+def sample_frames(image: Image.Image, max_frames: int = ANIMATION_MAX_FRAMES,
+                  strategy: str = ANIMATION_SAMPLING,
+                  scene_threshold: float = ANIMATION_SCENE_THRESHOLD) -> Iterator[Tuple[int, Image.Image]]:
+    """
+    Yield (frame index, RGB frame) for at most ``max_frames`` frames
+
+    Args:
+        image (PIL.Image): Opened, possibly animated image
+        max_frames (int): Frame budget
+        strategy (str): "uniform" spreads the budget over the animation; "scene"
+            keeps a frame whenever it differs enough from the last kept one
+        scene_threshold (float): Mean absolute grey-level change (0-255) of a new scene
+    """
+    if not is_animated(image):
+        yield 0, image.convert("RGB")
+        return
+
+    if strategy == "scene":
+        previous = None
+        kept = 0
+        for index, frame in enumerate(ImageSequence.Iterator(image)):
+            signature = _signature(frame)
+            if previous is None or float(np.abs(signature - previous).mean()) >= scene_threshold:
+                previous = signature
+                kept += 1
+                yield index, frame.convert("RGB")
+                if kept >= max_frames:
+                    return
+        return
+
+    for index in uniform_indices(image.n_frames, max_frames):
+        image.seek(index)
+        yield index, image.convert("RGB")
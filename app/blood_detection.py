@@ -1,9 +1,18 @@
 import cv2
 import torch
 import numpy as np
+from PIL import Image
 from segment_anything import sam_model_registry, SamAutomaticMaskGenerator
+from segment_anything.utils.amg import rle_to_mask
 import os
 import logging
+import threading
+from .metrics import stage_timer
+from .profiling import torch_trace
+from .config import BLOOD_PREFILTER_MIN_FRACTION, SAM_POINTS_PER_BATCH, MODEL_MMAP
+from . import model_store
+from . import animation
+from .admission import AdmissionRejected, admit, plan, header_size, decode_rgb
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -11,12 +20,22 @@ logger = logging.getLogger(__name__)
 # Initialize SAM model (singleton pattern)
 _sam_model = None
 _mask_generator = None
+# Guards the one-time load against two threads loading SAM at once
+_init_lock = threading.Lock()
+# SamAutomaticMaskGenerator keeps the current image embedding on its predictor
+# (set_image / features / reset_image), so only one image may run through it
+# at a time; concurrent calls would score masks against another image
+_generate_lock = threading.Lock()
 
 def initialize_sam_model():
     """Initialize the SAM model once"""
     global _sam_model, _mask_generator
     
-    if _sam_model is None:
+    if _mask_generator is not None:
+        return
+    with _init_lock:
+        if _mask_generator is not None:
+            return
         try:
             # Use absolute path to avoid issues
             current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -37,9 +56,24 @@ def initialize_sam_model():
             device = "cuda" if torch.cuda.is_available() else "cpu"
             logger.info(f"Loading SAM model on device: {device}")
             
-            _sam_model = sam_model_registry["vit_b"](checkpoint=sam_checkpoint)
-            _sam_model.to(device=device)
-            _mask_generator = SamAutomaticMaskGenerator(_sam_model)
+            safetensors_checkpoint = os.path.splitext(sam_checkpoint)[0] + ".safetensors"
+            if MODEL_MMAP and device == "cpu" and os.path.exists(safetensors_checkpoint):
+                # Weights stay in the shared page cache instead of a private copy per worker
+                logger.info(f"Memory-mapping SAM weights from {safetensors_checkpoint}")
+                sam_model = model_store.load_mmap_weights(
+                    sam_model_registry["vit_b"](checkpoint=None), safetensors_checkpoint
+                )
+            else:
+                sam_model = sam_model_registry["vit_b"](checkpoint=sam_checkpoint)
+            sam_model.to(device=device)
+            # RLE output keeps the full list of masks compact; find_blood_regions
+            # decodes them one at a time while scoring
+            mask_generator = SamAutomaticMaskGenerator(
+                sam_model, points_per_batch=SAM_POINTS_PER_BATCH, output_mode="uncompressed_rle"
+            )
+            # Publish the generator last so lock-free readers never see a half-built model
+            _sam_model = sam_model
+            _mask_generator = mask_generator
             
             logger.info("SAM model loaded successfully")
             
@@ -47,7 +81,10 @@ def initialize_sam_model():
             logger.error(f"Error loading SAM model: {e}")
             raise
 
-def is_blood_region(image_rgb, mask, red_threshold=0.35):
+# Share of the red channel in a region's mean colour above which it counts as blood
+BLOOD_RED_THRESHOLD = 0.35
+
+def is_blood_region(image_rgb, mask, red_threshold=BLOOD_RED_THRESHOLD):
     """Check if the masked region has dominant red."""
     try:
         region = image_rgb[mask.astype(bool)]
@@ -60,49 +97,217 @@ def is_blood_region(image_rgb, mask, red_threshold=0.35):
         logger.warning(f"Error in blood region detection: {e}")
         return False
 
+def has_red_content(image_rgb, min_fraction=BLOOD_PREFILTER_MIN_FRACTION, max_side=256,
+                    red_threshold=BLOOD_RED_THRESHOLD):
+    """
+    Cheap prefilter: is there enough red area to be worth running SAM?
+
+    Works on a strided thumbnail, so it costs well under a millisecond even for
+    large photos. It uses is_blood_region's criterion per pixel, with no
+    brightness floor: a region whose mean colour passes that check has pixels
+    that pass it too, so dark or dried blood isn't skipped. Only regions
+    covering less than ``min_fraction`` of the image can be missed.
+    """
+    height, width = image_rgb.shape[:2]
+    step = max(1, max(height, width) // max_side)
+    sample = image_rgb[::step, ::step].astype(np.float32)
+    red_ratio = sample[..., 0] / (sample.sum(axis=-1) + 1e-6)
+    red_pixels = red_ratio > red_threshold
+    return float(red_pixels.mean()) >= min_fraction
+
+def find_blood_regions(image_rgb, stage=None):
+    """
+    Run SAM on an RGB image and keep the mask records (segmentation, bbox, scores) with dominant red
+
+    Holds a reservation in the per-process memory budget for the duration of
+    the SAM pass. Masks are scored one at a time; only blood regions are kept
+    as decoded boolean arrays.
+    """
+    if _mask_generator is None:
+        initialize_sam_model()
+    stage = stage or stage_timer("detect_blood")
+    height, width = image_rgb.shape[:2]
+    
+    with admit(width, height):
+        # Generate masks
+        logger.info("Generating masks...")
+        with _generate_lock, stage("sam_generate"), torch_trace("detect_blood"):
+            masks = _mask_generator.generate(image_rgb)
+        logger.info(f"Generated {len(masks)} masks")
+        
+        # Filter masks with dominant red, dropping each record once scored
+        with stage("mask_filter"):
+            blood_regions = []
+            for i, record in enumerate(masks):
+                masks[i] = None
+                segmentation = record["segmentation"]
+                if isinstance(segmentation, dict):
+                    record["rle"] = segmentation
+                    segmentation = rle_to_mask(segmentation)
+                if is_blood_region(image_rgb, segmentation):
+                    record["segmentation"] = segmentation
+                    blood_regions.append(record)
+    logger.info(f"Found {len(blood_regions)} blood regions")
+    return blood_regions
+
+def find_blood_masks(image_rgb, stage=None):
+    """Run SAM on an RGB image and keep the masks with dominant red"""
+    return [region["segmentation"] for region in find_blood_regions(image_rgb, stage)]
+
+def encode_rle(mask):
+    """
+    Uncompressed COCO-style RLE of a boolean mask
+
+    Counts alternate background/foreground runs in column-major order, starting
+    with background, so pycocotools and most client libraries can decode it.
+    """
+    flat = np.asarray(mask, dtype=bool).ravel(order="F")
+    changes = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    boundaries = np.concatenate(([0], changes, [flat.size]))
+    counts = np.diff(boundaries).tolist()
+    if flat.size and flat[0]:
+        counts.insert(0, 0)
+    return {"size": [int(mask.shape[0]), int(mask.shape[1])], "counts": counts}
+
+def mask_polygons(mask, tolerance=1.5):
+    """Outer contours of a mask as flat [x0, y0, x1, y1, ...] lists, simplified by ``tolerance`` pixels"""
+    contours, _ = cv2.findContours(np.asarray(mask, dtype=np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    polygons = []
+    for contour in contours:
+        approx = cv2.approxPolyDP(contour, tolerance, True)
+        if len(approx) >= 3:
+            polygons.append(approx.reshape(-1).tolist())
+    return polygons
+
+def describe_regions(regions, mask_format="rle"):
+    """
+    Compact JSON description of blood regions
+
+    Args:
+        regions (list): Mask records from find_blood_regions
+        mask_format (str): "rle", "polygon" or None for boxes and scores only
+    """
+    described = []
+    for region in regions:
+        mask = region["segmentation"]
+        item = {
+            "bbox": [int(v) for v in region["bbox"]],  # x, y, width, height
+            "area": int(region["area"]),
+            "score": float(region.get("predicted_iou", 0.0)),
+            "stability_score": float(region.get("stability_score", 0.0)),
+        }
+        if mask_format == "rle":
+            # SAM already produced the same column-major RLE
+            item["rle"] = region.get("rle") or encode_rle(mask)
+        elif mask_format == "polygon":
+            item["polygons"] = mask_polygons(mask)
+        described.append(item)
+    return described
+
+def highlight_masks(image, blood_masks):
+    """Copy of a BGR image with the masked pixels blended towards red"""
+    output = image.copy()
+    
+    # Highlight blood regions with red overlay instead of blur
+    for mask in blood_masks:
+        try:
+            # Create red overlay for blood regions
+            red_overlay = np.zeros_like(image)
+            red_overlay[mask == 1] = [0, 0, 255]  # Red color in BGR
+            
+            # Blend with original image
+            alpha = 0.6  # Transparency
+            output[mask == 1] = cv2.addWeighted(image[mask == 1], 1 - alpha, 
+                                               red_overlay[mask == 1], alpha, 0)
+        except Exception as e:
+            logger.warning(f"Error processing mask: {e}")
+            continue
+    return output
+
+def redact_regions(image, regions, mode="blur", strength=16):
+    """
+    Blur or pixelate masked pixels, touching only each region's bounding box
+
+    Args:
+        image (np.ndarray): Image to redact (any channel order); not modified
+        regions (list): Mask records from find_blood_regions
+        mode (str): "blur" or "pixelate"
+        strength (int): Pixelation block size / blur kernel scale in pixels
+    """
+    output = image.copy()
+    for region in regions:
+        x, y, w, h = [int(v) for v in region["bbox"]]
+        if w <= 0 or h <= 0:
+            continue
+        roi = output[y:y + h, x:x + w]
+        mask = np.asarray(region["segmentation"], dtype=bool)[y:y + h, x:x + w]
+        if mode == "pixelate":
+            small = cv2.resize(roi, (max(1, w // strength), max(1, h // strength)), interpolation=cv2.INTER_AREA)
+            redacted = cv2.resize(small, (w, h), interpolation=cv2.INTER_NEAREST)
+        else:
+            kernel = strength * 2 + 1
+            redacted = cv2.GaussianBlur(roi, (kernel, kernel), 0)
+        roi[mask] = redacted[mask]
+    return output
+
+def count_blood_regions(image_rgb, use_prefilter=True):
+    """
+    Blood check on an already decoded RGB image, without writing an overlay
+
+    Returns:
+        dict: ``prefilter_passed`` and the number of ``regions`` found
+    """
+    if use_prefilter and not has_red_content(image_rgb):
+        return {"prefilter_passed": False, "regions": 0}
+    return {"prefilter_passed": True, "regions": len(find_blood_masks(image_rgb))}
+
+def read_image(image_path, stage=None):
+    """
+    Decode an image for blood detection within the admission limits
+
+    The size comes from the header; oversized inputs are decoded downscaled.
+
+    Returns:
+        tuple: (BGR array, RGB array, scale applied)
+
+    Raises:
+        AdmissionRejected: The image is too large to process
+    """
+    stage = stage or stage_timer("detect_blood")
+    with stage("read"):
+        width, height = header_size(image_path)
+        scale = plan(width, height)
+        image_rgb = decode_rgb(image_path, scale)
+        image = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR)
+    return image, image_rgb, scale
+
 def detect_blood(image_path):
-    """Return an image with red regions detected and processed."""
+    """
+    Write a copy of the image with blood regions highlighted
+
+    Returns:
+        dict: ``processed_path`` (the input path if detection failed),
+        ``regions_detected`` and the ``width``, ``height`` and ``scale`` of the
+        analysed image, which admission may have downscaled
+    """
     # Initialize model if not already done
-    if _sam_model is None:
+    if _mask_generator is None:
         initialize_sam_model()
     
+    stage = stage_timer("detect_blood")
+    
     try:
         # Read and validate image
         if not os.path.exists(image_path):
             raise FileNotFoundError(f"Image not found: {image_path}")
         
-        image = cv2.imread(image_path)
-        if image is None:
-            raise ValueError(f"Failed to read image: {image_path}")
-        
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        
-        # Generate masks
-        logger.info("Generating masks...")
-        masks = _mask_generator.generate(image_rgb)
-        logger.info(f"Generated {len(masks)} masks")
-        
-        # Filter masks with dominant red
-        blood_masks = [m["segmentation"] for m in masks if is_blood_region(image_rgb, m["segmentation"])]
-        logger.info(f"Found {len(blood_masks)} blood regions")
+        image, image_rgb, scale = read_image(image_path, stage)
         
-        # Create output image with blood regions highlighted
-        output = image.copy()
+        blood_masks = find_blood_masks(image_rgb, stage)
         
-        # Highlight blood regions with red overlay instead of blur
-        for mask in blood_masks:
-            try:
-                # Create red overlay for blood regions
-                red_overlay = np.zeros_like(image)
-                red_overlay[mask == 1] = [0, 0, 255]  # Red color in BGR
-                
-                # Blend with original image
-                alpha = 0.6  # Transparency
-                output[mask == 1] = cv2.addWeighted(image[mask == 1], 1 - alpha, 
-                                                   red_overlay[mask == 1], alpha, 0)
-            except Exception as e:
-                logger.warning(f"Error processing mask: {e}")
-                continue
+        with stage("overlay"):
+            # Create output image with blood regions highlighted
+            output = highlight_masks(image, blood_masks)
         
         # Save processed image
         output_dir = "processed_images"
@@ -113,11 +318,123 @@ def detect_blood(image_path):
         output_filename = f"{name}_blood_detected{ext}"
         output_path = os.path.join(output_dir, output_filename)
         
-        cv2.imwrite(output_path, output)
+        with stage("write"):
+            cv2.imwrite(output_path, output)
         
-        return output_path, len(blood_masks)
+        height, width = image.shape[:2]
+        return {"processed_path": output_path, "regions_detected": len(blood_masks),
+                "width": width, "height": height, "scale": scale}
         
+    except AdmissionRejected:
+        raise
     except Exception as e:
         logger.error(f"Error in blood detection: {e}")
         # Return original image path and 0 detections
-        return image_path, 0
\ No newline at end of file
+        return {"processed_path": image_path, "regions_detected": 0}
+
+REDACT_MODES = ("blur", "pixelate")
+MASK_FORMATS = ("rle", "polygon")
+
+def detect_blood_regions(image_path, mask_format="rle", redact=None, use_prefilter=True):
+    """
+    Blood regions as compact JSON instead of a re-encoded overlay image
+
+    Args:
+        image_path (str): Path to the image
+        mask_format (str): "rle", "polygon" or None for boxes and scores only
+        redact (str): Optional "blur" or "pixelate"; writes a redacted copy to processed_images
+        use_prefilter (bool): Skip SAM when the image has almost no red
+
+    Returns:
+        dict: ``width``, ``height`` and ``scale`` of the analysed image, ``regions`` and,
+        when redacting, ``processed_path``
+    """
+    stage = stage_timer("detect_blood")
+    
+    image, image_rgb, scale = read_image(image_path, stage)
+    
+    height, width = image.shape[:2]
+    if use_prefilter and not has_red_content(image_rgb):
+        regions = []
+    else:
+        regions = find_blood_regions(image_rgb, stage)
+    
+    with stage("encode_masks"):
+        result = {"width": width, "height": height, "scale": scale,
+                  "regions": describe_regions(regions, mask_format)}
+    
+    if redact:
+        with stage("redact"):
+            output = redact_regions(image, regions, redact)
+        
+        output_dir = "processed_images"
+        os.makedirs(output_dir, exist_ok=True)
+        name, ext = os.path.splitext(os.path.basename(image_path))
+        output_path = os.path.join(output_dir, f"{name}_blood_{redact}{ext}")
+        with stage("write"):
+            cv2.imwrite(output_path, output)
+        result["processed_path"] = output_path
+    
+    return result
+
+def detect_blood_animated(image, mask_format="rle", output_name=None, render=None):
+    """
+    Blood check over sampled frames of an animated image
+
+    Every sampled frame goes through the red prefilter and only passing frames
+    reach SAM; sampling (and decoding) stops at the first frame with blood.
+
+    Args:
+        image (PIL.Image): Opened animated GIF/WebP
+        mask_format (str): "rle", "polygon" or None for boxes and scores only
+        output_name (str): Base name for a rendered frame in processed_images
+        render (str): None, "overlay", "blur" or "pixelate"; renders the flagged
+            frame (or the first frame when nothing is flagged) as PNG
+
+    Returns:
+        dict: ``width``, ``height``, ``regions`` of the flagged frame, ``frame_index``,
+        ``frames_analyzed``, ``frames_prefiltered`` and, when rendering, ``processed_path``
+    """
+    stage = stage_timer("detect_blood")
+    analyzed = prefiltered = 0
+    first_frame = flagged_frame = None
+    regions = []
+    scale = plan(image.width, image.height)
+    size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+    result = {"width": size[0], "height": size[1], "scale": scale, "regions": [], "frame_index": None}
+    
+    for index, frame in animation.sample_frames(image):
+        analyzed += 1
+        if scale < 1.0:
+            frame = frame.resize(size, Image.BILINEAR)
+        frame_rgb = np.asarray(frame)
+        if first_frame is None:
+            first_frame = frame_rgb
+        if not has_red_content(frame_rgb):
+            prefiltered += 1
+            continue
+        regions = find_blood_regions(frame_rgb, stage)
+        if regions:
+            flagged_frame = frame_rgb
+            with stage("encode_masks"):
+                result.update(regions=describe_regions(regions, mask_format), frame_index=index)
+            break
+    
+    result.update(frames_analyzed=analyzed, frames_prefiltered=prefiltered)
+    
+    if render and first_frame is not None:
+        frame_bgr = cv2.cvtColor(flagged_frame if flagged_frame is not None else first_frame, cv2.COLOR_RGB2BGR)
+        with stage("overlay" if render == "overlay" else "redact"):
+            if render == "overlay":
+                output = highlight_masks(frame_bgr, [region["segmentation"] for region in regions])
+            else:
+                output = redact_regions(frame_bgr, regions, render)
+        
+        output_dir = "processed_images"
+        os.makedirs(output_dir, exist_ok=True)
+        output_path = os.path.join(output_dir, f"{output_name or 'animation'}_blood_{render}.png")
+        with stage("write"):
+            cv2.imwrite(output_path, output)
+        result["processed_path"] = output_path
+    
+    return result
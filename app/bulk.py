@@ -0,0 +1,348 @@
+"""
+Offline bulk moderation
+
+Re-scores archives of posts or images without going through the HTTP API.
+Items are read lazily in a fixed order, grouped into batches and classified
+by a pool of worker processes that each load the models once; at most
+``--workers * 2`` batches are in flight, so memory stays bounded whatever
+the input size. Results are written in input order and progress is
+checkpointed after every flush, so an interrupted run resumes exactly where
+it stopped (``--resume``).
+
+Inputs:
+    *.jsonl / *.csv   rows with a text column (--text-field) and/or an image
+                      path column (--image-field); --id-field names the id
+    a directory       every image file below it, in sorted order
+
+Outputs:
+    *.jsonl           one JSON object per item, appended
+    a directory       Parquet part files (requires pyarrow); any path without
+                      a suffix, or ending in "/", is treated as one
+
+An existing output or checkpoint is never replaced silently: pass --resume to
+continue it or --overwrite to start over.
+
+Usage:
+    python -m app.bulk --input posts.jsonl --output scores.jsonl --workers 4
+    python -m app.bulk --input uploads/ --output scores/ --format parquet --blood-prefilter --resume
+"""
+import os
+import csv
+import sys
+import json
+import time
+import logging
+import argparse
+import multiprocessing as mp
+from collections import deque
+from itertools import islice
+from typing import Iterator, List, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpeg", ".jpg", ".png", ".gif", ".webp", ".bmp"}
+
+
+# -------------------------
+# Input
+# -------------------------
+
+def read_items(path: str, text_field: str = "text", image_field: str = "image",
+               id_field: str = "id") -> Iterator[dict]:
+    """Yield {"id", "text"?, "image"?} items in a stable order"""
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                    full_path = os.path.join(root, name)
+                    yield {"id": os.path.relpath(full_path, path), "image": full_path}
+        return
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    if path.endswith(".csv"):
+        rows = csv.DictReader(open(path, newline="", encoding="utf-8"))
+    else:
+        rows = (json.loads(line) for line in open(path, encoding="utf-8") if line.strip())
+    for index, row in enumerate(rows):
+        item = {"id": row.get(id_field, index)}
+        if row.get(text_field):
+            item["text"] = row[text_field]
+        if row.get(image_field):
+            image = row[image_field]
+            item["image"] = image if os.path.isabs(image) else os.path.join(base_dir, image)
+        yield item
+
+
+def batched(items: Iterator[dict], size: int) -> Iterator[List[dict]]:
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+# -------------------------
+# Workers
+# -------------------------
+
+_options = {}
+
+
+def _init_worker(options: dict):
+    """Load the models once per worker process"""
+    import torch
+
+    _options.update(options)
+    torch.set_num_threads(options["threads"])
+    logging.basicConfig(level=logging.WARNING)
+    from . import load_models  # noqa: F401  (instantiates the model loader)
+    if options["blood_prefilter"]:
+        from . import blood_detection  # noqa: F401
+
+
+def score_batch(batch: List[dict]) -> List[dict]:
+    """Classify one batch; runs inside a worker process"""
+    from .load_models import classify_texts, classify_images
+
+    records = [{"id": item["id"]} for item in batch]
+
+    texts = [(i, item["text"]) for i, item in enumerate(batch) if "text" in item]
+    if texts:
+        for (i, _), result in zip(texts, classify_texts([text for _, text in texts])):
+            records[i]["text"] = _summarise(result)
+
+    images = [(i, item["image"]) for i, item in enumerate(batch) if "image" in item]
+    if images:
+        for (i, path), result in zip(images, classify_images([path for _, path in images])):
+            records[i]["image"] = _summarise(result)
+            if _options.get("blood_prefilter") and result.get("label") != "ERROR":
+                records[i]["image"]["blood_prefilter_passed"] = _blood_prefilter(path)
+
+    for record in records:
+        parts = [record[key] for key in ("text", "image") if key in record]
+        record["is_appropriate"] = all(part["is_appropriate"] for part in parts) if parts else None
+    return records
+
+
+def _summarise(result: dict) -> dict:
+    from .load_models import is_appropriate
+
+    summary = {
+        "label": result.get("label"),
+        "confidence": result.get("confidence"),
+        "model_version": result.get("model_version"),
+        "is_appropriate": is_appropriate(result),
+    }
+    if "error" in result:
+        summary["error"] = result["error"]
+    return summary
+
+
+def _blood_prefilter(path: str) -> Optional[bool]:
+    from .admission import decode_rgb, header_size, plan_scale
+    from .blood_detection import has_red_content
+
+    try:
+        width, height = header_size(path)
+        return bool(has_red_content(decode_rgb(path, plan_scale(width, height))))
+    except Exception as e:
+        logger.warning(f"Blood prefilter failed for {path}: {e}")
+        return None
+
+
+# -------------------------
+# Output and checkpoints
+# -------------------------
+
+class JsonlWriter:
+    """Appends records; the checkpoint stores the byte offset of the last flush"""
+
+    def __init__(self, path: str, offset: int = 0):
+        self.path = path
+        mode = "r+b" if os.path.exists(path) else "wb"
+        self.file = open(path, mode)
+        # Drop anything written after the last checkpoint
+        self.file.truncate(offset)
+        self.file.seek(offset)
+
+    def write(self, records: List[dict]):
+        for record in records:
+            self.file.write((json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8"))
+
+    def flush(self) -> dict:
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return {"offset": self.file.tell()}
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """Writes one part file per flush; the checkpoint stores the part count"""
+
+    def __init__(self, directory: str, parts: int = 0):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise SystemExit("Parquet output requires the 'pyarrow' package") from e
+        self.directory = directory
+        self.parts = parts
+        self.pending: List[dict] = []
+        os.makedirs(directory, exist_ok=True)
+        # Drop parts written after the last checkpoint
+        for name in os.listdir(directory):
+            if name.startswith("part-") and name.endswith(".parquet") and int(name[5:10]) >= parts:
+                os.remove(os.path.join(directory, name))
+
+    def write(self, records: List[dict]):
+        self.pending.extend(records)
+
+    def flush(self) -> dict:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self.pending:
+            # Nested results are stored as JSON strings to keep one flat schema
+            columns = {
+                "id": [str(record["id"]) for record in self.pending],
+                "is_appropriate": [record["is_appropriate"] for record in self.pending],
+                "text": [json.dumps(record["text"]) if "text" in record else None for record in self.pending],
+                "image": [json.dumps(record["image"]) if "image" in record else None for record in self.pending],
+            }
+            pq.write_table(pa.table(columns), os.path.join(self.directory, f"part-{self.parts:05d}.parquet"))
+            self.parts += 1
+            self.pending = []
+        return {"parts": self.parts}
+
+    def close(self):
+        pass
+
+
+def output_format(path: str) -> Optional[str]:
+    """Infer the format from --output; None if the suffix isn't one we write"""
+    if path.endswith(("/", os.sep)) or os.path.isdir(path):
+        return "parquet"
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix == ".jsonl":
+        return "jsonl"
+    if suffix in ("", ".parquet"):
+        return "parquet"
+    return None
+
+
+def load_checkpoint(path: str) -> dict:
+    if not os.path.exists(path):
+        return {"done": 0}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path: str, state: dict):
+    temporary = path + ".tmp"
+    with open(temporary, "w") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+
+# -------------------------
+# Pipeline
+# -------------------------
+
+def run(args) -> dict:
+    checkpoint_path = args.checkpoint or (args.output.rstrip("/") + ".checkpoint.json")
+    existing = [path for path in (args.output, checkpoint_path) if os.path.exists(path)]
+    if existing and not (args.resume or args.overwrite):
+        raise SystemExit(f"Refusing to replace {', '.join(existing)}; pass --resume to continue or --overwrite to start over")
+    if args.overwrite and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    state = load_checkpoint(checkpoint_path) if args.resume else {"done": 0}
+    if args.resume and state.get("input") not in (None, os.path.abspath(args.input)):
+        raise SystemExit(f"Checkpoint {checkpoint_path} belongs to {state['input']}")
+
+    if args.format == "parquet":
+        writer = ParquetWriter(args.output, state.get("parts", 0))
+    else:
+        writer = JsonlWriter(args.output, state.get("offset", 0))
+
+    items = read_items(args.input, args.text_field, args.image_field, args.id_field)
+    done = state["done"]
+    if done:
+        logger.info(f"Resuming after {done} items")
+        items = islice(items, done, None)
+
+    options = {
+        "threads": args.threads or max(1, (os.cpu_count() or 1) // args.workers),
+        "blood_prefilter": args.blood_prefilter,
+    }
+    ctx = mp.get_context("spawn")
+    start = time.perf_counter()
+    processed = 0
+    since_flush = 0
+
+    def commit():
+        state.update(writer.flush(), done=done + processed, input=os.path.abspath(args.input))
+        save_checkpoint(checkpoint_path, state)
+
+    with ctx.Pool(args.workers, initializer=_init_worker, initargs=(options,)) as pool:
+        in_flight = deque()
+        batches = batched(iter(items), args.batch_size)
+        exhausted = False
+        while in_flight or not exhausted:
+            # Keep a bounded number of batches queued so memory doesn't grow with the input
+            while not exhausted and len(in_flight) < args.workers * 2:
+                batch = next(batches, None)
+                if batch is None:
+                    exhausted = True
+                else:
+                    in_flight.append(pool.apply_async(score_batch, (batch,)))
+            if not in_flight:
+                break
+            records = in_flight.popleft().get()
+            writer.write(records)
+            processed += len(records)
+            since_flush += len(records)
+            if since_flush >= args.flush_every:
+                commit()
+                since_flush = 0
+                rate = processed / (time.perf_counter() - start)
+                logger.info(f"{done + processed} items done ({rate:.1f} items/s)")
+        commit()
+    writer.close()
+    return {"processed": processed, "total": done + processed, "seconds": time.perf_counter() - start}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", required=True, help="JSONL/CSV file or image directory")
+    parser.add_argument("--output", required=True, help="JSONL file or Parquet directory")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], help="Default: from --output")
+    parser.add_argument("--text-field", default="text")
+    parser.add_argument("--image-field", default="image")
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--threads", type=int, help="torch threads per worker (default: cpus / workers)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--flush-every", type=int, default=1000, help="Items between output flushes/checkpoints")
+    parser.add_argument("--blood-prefilter", action="store_true", help="Also run the red-content prefilter on images")
+    parser.add_argument("--checkpoint", help="Default: <output>.checkpoint.json")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--resume", action="store_true", help="Continue from the checkpoint")
+    mode.add_argument("--overwrite", action="store_true", help="Replace an existing output and checkpoint")
+    args = parser.parse_args(argv)
+    args.format = args.format or output_format(args.output)
+    if args.format is None:
+        parser.error(f"Can't infer the format of {args.output}; use a .jsonl file, a directory or --format")
+
+    logging.basicConfig(level=logging.INFO)
+    summary = run(args)
+    logger.info(f"Scored {summary['processed']} items ({summary['total']} total) in {summary['seconds']:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+"""
+Confidence-based classification cascade
+
+A cheap linear first stage (hashed character n-grams for text, a colour
+histogram for images) scores every input. Scores outside the uncertainty band
+[low, high] are decided immediately; only inputs inside the band escalate to
+the transformer models in ModelLoader. Stage-one models are trained offline
+and stored as .npz files:
+
+    python -m app.cascade train --kind text --input labelled.jsonl --output app/models/text_cascade.npz
+    python -m app.cascade train --kind image --input labelled_images.jsonl --output app/models/image_cascade.npz
+
+Training input is JSONL with {"text": ..., "label": 0|1} or
+{"path": ..., "label": 0|1}, 1 meaning inappropriate.
+"""
+import os
+import sys
+import json
+import math
+import zlib
+import random
+import logging
+import argparse
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import (
+    CASCADE_ENABLED, TEXT_CASCADE_PATH, IMAGE_CASCADE_PATH,
+    CASCADE_TEXT_BAND, CASCADE_IMAGE_BAND
+)
+from .metrics import registry, Counter
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+CASCADE_DECISIONS = registry.register(Counter(
+    "sawtna_cascade_decisions_total", "Classification cascade outcomes",
+    ["kind", "outcome"]
+))
+
+TEXT_DIMENSIONS = 2 ** 18
+NGRAM_RANGE = (2, 4)
+IMAGE_BINS = (8, 4, 4)
+
+
+def text_features(text: str, dimensions: int = TEXT_DIMENSIONS, ngram_range=NGRAM_RANGE) -> Dict[int, float]:
+    """L2-normalised hashed character n-gram counts (stable crc32 hashing)"""
+    padded = f" {' '.join(text.lower().split())} "
+    counts: Dict[int, float] = {}
+    for n in range(ngram_range[0], ngram_range[1] + 1):
+        for i in range(len(padded) - n + 1):
+            index = zlib.crc32(padded[i:i + n].encode("utf-8")) % dimensions
+            counts[index] = counts.get(index, 0.0) + 1.0
+    norm = math.sqrt(sum(value * value for value in counts.values())) or 1.0
+    return {index: value / norm for index, value in counts.items()}
+
+
+def image_features(image) -> np.ndarray:
+    """HSV colour histogram of a small thumbnail plus the strongly-red pixel fraction"""
+    small = image.convert("RGB").resize((32, 32))
+    hsv = np.asarray(small.convert("HSV"), dtype=np.float32) / 256.0
+    histogram, _ = np.histogramdd(hsv.reshape(-1, 3), bins=IMAGE_BINS, range=((0, 1), (0, 1), (0, 1)))
+    rgb = np.asarray(small, dtype=np.float32)
+    red_fraction = float(((rgb[..., 0] / (rgb.sum(axis=-1) + 1e-6)) > 0.45).mean())
+    features = np.append(histogram.ravel() / histogram.sum(), red_fraction)
+    return features.astype(np.float32)
+
+
+def _sigmoid(value: float) -> float:
+    if value >= 0:
+        return 1.0 / (1.0 + math.exp(-value))
+    z = math.exp(value)
+    return z / (1.0 + z)
+
+
+class LinearStage:
+    """Logistic-regression first stage over sparse (text) or dense (image) features"""
+
+    def __init__(self, kind: str, weights: np.ndarray, bias: float, version: str = "untrained"):
+        self.kind = kind
+        self.weights = weights
+        self.bias = bias
+        self.version = version
+
+    def score(self, features) -> float:
+        """Probability that the input is inappropriate"""
+        if isinstance(features, dict):
+            logit = self.bias + sum(self.weights[index] * value for index, value in features.items())
+        else:
+            logit = self.bias + float(np.dot(self.weights, features))
+        return _sigmoid(float(logit))
+
+    def save(self, path: str):
+        np.savez_compressed(path, weights=self.weights, bias=np.array([self.bias]),
+                            meta=np.array(json.dumps({"kind": self.kind, "version": self.version})))
+
+    @classmethod
+    def load(cls, path: str) -> "LinearStage":
+        data = np.load(path, allow_pickle=False)
+        meta = json.loads(str(data["meta"]))
+        return cls(meta["kind"], data["weights"], float(data["bias"][0]), meta.get("version", "unknown"))
+
+
+class Cascade:
+    """
+    Decide confident inputs with the first stage, escalate the rest
+
+    Args:
+        stage (LinearStage): Trained first stage
+        low (float): Scores at or below are decided APPROPRIATE
+        high (float): Scores at or above are decided INAPPROPRIATE
+    """
+
+    def __init__(self, stage: LinearStage, low: float, high: float):
+        self.stage = stage
+        self.low = low
+        self.high = high
+        self.decided = 0
+        self.escalated = 0
+        self._lock = threading.Lock()
+
+    def decide(self, features) -> Tuple[Optional[dict], float]:
+        """Return (result, score); result is None when the input must escalate"""
+        score = self.stage.score(features)
+        if score <= self.low:
+            result = {"label": "APPROPRIATE", "confidence": 1.0 - score}
+            outcome = "stage1_appropriate"
+        elif score >= self.high:
+            result = {"label": "INAPPROPRIATE", "confidence": score}
+            outcome = "stage1_inappropriate"
+        else:
+            result, outcome = None, "escalated"
+        with self._lock:
+            if result is None:
+                self.escalated += 1
+            else:
+                self.decided += 1
+        CASCADE_DECISIONS.inc(kind=self.stage.kind, outcome=outcome)
+        if result is not None:
+            result.update(cascade_stage=1, cascade_score=score,
+                          model_version=f"cascade:{self.stage.version}")
+        return result, score
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.decided + self.escalated
+            return {
+                "version": self.stage.version,
+                "band": [self.low, self.high],
+                "decided": self.decided,
+                "escalated": self.escalated,
+                "escalation_rate": self.escalated / total if total else None,
+            }
+
+
+def _load(kind: str, path: str, band) -> Optional[Cascade]:
+    if not CASCADE_ENABLED or not os.path.exists(path):
+        return None
+    try:
+        stage = LinearStage.load(path)
+        logger.info(f"Loaded {kind} cascade stage {stage.version} from {path}, band {band}")
+        return Cascade(stage, *band)
+    except Exception as e:
+        logger.error(f"Error loading {kind} cascade from {path}: {e}")
+        return None
+
+
+# Loaded once per process; None when disabled or no trained stage exists
+text_cascade = _load("text", TEXT_CASCADE_PATH, CASCADE_TEXT_BAND)
+image_cascade = _load("image", IMAGE_CASCADE_PATH, CASCADE_IMAGE_BAND)
+
+
+def cascade_stats() -> dict:
+    return {
+        "text": text_cascade.stats() if text_cascade else None,
+        "image": image_cascade.stats() if image_cascade else None,
+    }
+
+
+# -------------------------
+# Offline training
+# -------------------------
+
+def train(kind: str, samples: List[Tuple[object, int]], epochs: int = 5, learning_rate: float = 0.5,
+          l2: float = 1e-6, seed: int = 0, version: str = "v1") -> LinearStage:
+    """Plain SGD logistic regression over pre-computed features"""
+    rng = random.Random(seed)
+    if kind == "text":
+        weights = np.zeros(TEXT_DIMENSIONS, dtype=np.float32)
+    else:
+        weights = np.zeros(len(samples[0][0]), dtype=np.float32)
+    bias = 0.0
+    order = list(range(len(samples)))
+    for epoch in range(epochs):
+        rng.shuffle(order)
+        loss = 0.0
+        for i in order:
+            features, label = samples[i]
+            if kind == "text":
+                logit = bias + sum(weights[index] * value for index, value in features.items())
+            else:
+                logit = bias + float(np.dot(weights, features))
+            p = _sigmoid(logit)
+            loss -= math.log(max(p if label else 1 - p, 1e-12))
+            gradient = p - label
+            if kind == "text":
+                for index, value in features.items():
+                    weights[index] -= learning_rate * (gradient * value + l2 * weights[index])
+            else:
+                weights -= learning_rate * (gradient * features + l2 * weights)
+            bias -= learning_rate * gradient
+        logger.info(f"epoch {epoch + 1}/{epochs}: mean log-loss {loss / len(samples):.4f}")
+    return LinearStage(kind, weights, bias, version)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    train_parser = subparsers.add_parser("train", help="Train a first-stage model")
+    train_parser.add_argument("--kind", choices=["text", "image"], required=True)
+    train_parser.add_argument("--input", required=True, help="Labelled JSONL")
+    train_parser.add_argument("--output", required=True, help="Destination .npz")
+    train_parser.add_argument("--epochs", type=int, default=5)
+    train_parser.add_argument("--learning-rate", type=float, default=0.5)
+    train_parser.add_argument("--version", default="v1")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    samples = []
+    with open(args.input, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if args.kind == "text":
+                features = text_features(record["text"])
+            else:
+                from PIL import Image
+                with Image.open(record["path"]) as image:
+                    features = image_features(image)
+            samples.append((features, int(record["label"])))
+
+    stage = train(args.kind, samples, epochs=args.epochs, learning_rate=args.learning_rate, version=args.version)
+    stage.save(args.output)
+    logger.info(f"Saved {args.kind} cascade stage trained on {len(samples)} samples to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
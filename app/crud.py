@@ -1,12 +1,19 @@
+import re
+import json
+import base64
+from datetime import datetime
+from sqlalchemy import select, tuple_, func, literal_column
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
 from sqlalchemy.exc import IntegrityError
 from . import models, schemas
-from passlib.context import CryptContext
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from .user_cache import user_cache
+from .rollups import record_usage, record_usage_async
+from .hashing import pwd_context, hash_password, hash_password_async, verify_and_update
 
 def get_password_hash(password: str):
-    return pwd_context.hash(password)
+    return hash_password(password)
 
 def verify_password(plain_password: str, hashed_password: str):
     return pwd_context.verify(plain_password, hashed_password)
@@ -29,14 +36,24 @@ def create_user(db: Session, user: schemas.UserCreate):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    user_cache.invalidate(db_user.username)
     return db_user
 
+def update_password_hash(db: Session, user: models.User, new_hash: str):
+    user.hashed_password = new_hash
+    db.commit()
+    user_cache.invalidate(user.username)
+    return user
+
 def authenticate_user(db: Session, username: str, password: str):
     user = get_user_by_username(db, username)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = verify_and_update(password, user.hashed_password)
+    if not valid:
         return False
+    if new_hash:
+        update_password_hash(db, user, new_hash)
     return user
 
 def get_contents_by_user(db: Session, user_id: int, skip: int = 0, limit: int = 100):
@@ -56,9 +73,209 @@ def create_content(db: Session, content: schemas.ContentCreate):
     
     try:
         db.add(db_content)
+        record_usage(db, [content])
         db.commit()
         db.refresh(db_content)
         return db_content
     except IntegrityError:
         db.rollback()
-        return None
\ No newline at end of file
+        return None
+
+def create_contents(db: Session, contents: List[schemas.ContentCreate]):
+    """Insert several content rows in one transaction (single commit, no refresh)"""
+    db_contents = [
+        models.GeneratedContent(
+            user_id=content.user_id,
+            content_type=content.content_type,
+            title=content.title,
+            text=content.text,
+            image_path=content.image_path,
+            content_metadata=content.content_metadata
+        )
+        for content in contents
+    ]
+    if not db_contents:
+        return []
+
+    try:
+        db.add_all(db_contents)
+        db.flush()  # assigns primary keys without a per-row refresh
+        record_usage(db, contents)
+        db.commit()
+        return db_contents
+    except IntegrityError:
+        db.rollback()
+        return None
+
+
+# Async variants used by the async auth and content routes
+
+async def get_user_by_username_async(db: AsyncSession, username: str):
+    result = await db.execute(select(models.User).where(models.User.username == username))
+    return result.scalars().first()
+
+async def create_user_async(db: AsyncSession, user: schemas.UserCreate):
+    existing_user = await get_user_by_username_async(db, user.username)
+    if existing_user:
+        return None
+
+    hashed_password = await hash_password_async(user.password)
+    db_user = models.User(
+        username=user.username,
+        full_name=user.full_name,
+        hashed_password=hashed_password,
+        is_active=True
+    )
+    try:
+        db.add(db_user)
+        await db.commit()
+        await db.refresh(db_user)
+    except IntegrityError:
+        await db.rollback()
+        return None
+    user_cache.invalidate(db_user.username)
+    return db_user
+
+async def update_password_hash_async(db: AsyncSession, user: models.User, new_hash: str):
+    user.hashed_password = new_hash
+    await db.commit()
+    user_cache.invalidate(user.username)
+    return user
+
+async def get_contents_by_user_async(db: AsyncSession, user_id: int, skip: int = 0, limit: int = 100):
+    result = await db.execute(
+        select(models.GeneratedContent)
+        .where(models.GeneratedContent.user_id == user_id)
+        .order_by(models.GeneratedContent.created_at.desc())
+        .offset(skip)
+        .limit(limit)
+    )
+    return result.scalars().all()
+
+async def create_content_async(db: AsyncSession, content: schemas.ContentCreate):
+    db_content = models.GeneratedContent(
+        user_id=content.user_id,
+        content_type=content.content_type,
+        title=content.title,
+        text=content.text,
+        image_path=content.image_path,
+        content_metadata=content.content_metadata
+    )
+
+    try:
+        db.add(db_content)
+        await record_usage_async(db, [content])
+        await db.commit()
+        await db.refresh(db_content)
+        return db_content
+    except IntegrityError:
+        await db.rollback()
+        return None
+
+
+# Keyset pagination over a user's history, newest first
+
+def _encode_token(data: dict) -> str:
+    raw = json.dumps(data)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def _decode_token(cursor: str) -> dict:
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    return json.loads(raw)
+
+def encode_cursor(created_at: datetime, content_id: int) -> str:
+    return _encode_token({"t": created_at.isoformat(), "id": content_id})
+
+def decode_cursor(cursor: str):
+    """Return (created_at, id) from an opaque cursor; raises ValueError if malformed"""
+    try:
+        data = _decode_token(cursor)
+        return datetime.fromisoformat(data["t"]), int(data["id"])
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+SUMMARY_COLUMNS = (
+    models.GeneratedContent.id,
+    models.GeneratedContent.user_id,
+    models.GeneratedContent.content_type,
+    models.GeneratedContent.title,
+    models.GeneratedContent.image_path,
+    models.GeneratedContent.created_at,
+)
+
+async def get_contents_page_async(db: AsyncSession, user_id: int, cursor: str = None,
+                                  limit: int = 20, summary: bool = False):
+    """
+    Fetch one page of a user's content with keyset pagination
+
+    Returns:
+        tuple: (rows, next_cursor), next_cursor is None on the last page
+    """
+    content = models.GeneratedContent
+    query = select(*SUMMARY_COLUMNS) if summary else select(content)
+    query = query.where(content.user_id == user_id)
+    if cursor:
+        created_at, content_id = decode_cursor(cursor)
+        query = query.where(tuple_(content.created_at, content.id) < tuple_(created_at, content_id))
+    # Fetch one extra row to know whether another page exists
+    query = query.order_by(content.created_at.desc(), content.id.desc()).limit(limit + 1)
+
+    result = await db.execute(query)
+    rows = result.all() if summary else result.scalars().all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
+
+
+# Full-text search over title, text and the original (pre-neutralized) text
+
+_ARABIC_DIACRITICS_RE = re.compile(models.ARABIC_DIACRITICS)
+
+def encode_search_cursor(rank: float, content_id: int) -> str:
+    return _encode_token({"r": rank, "id": content_id})
+
+def decode_search_cursor(cursor: str):
+    """Return (rank, id) from an opaque search cursor; raises ValueError if malformed"""
+    try:
+        data = _decode_token(cursor)
+        return float(data["r"]), int(data["id"])
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+async def search_contents_async(db: AsyncSession, user_id: int, query_text: str, cursor: str = None,
+                                limit: int = 20, summary: bool = False):
+    """
+    Ranked full-text search over a user's content, paginated by (rank, id)
+
+    Returns:
+        tuple: (rows, next_cursor); each row has ``rank`` and the content
+        (``row.GeneratedContent``) or the summary columns
+    """
+    content = models.GeneratedContent
+    normalized = _ARABIC_DIACRITICS_RE.sub("", query_text)
+    ts_query = func.websearch_to_tsquery(literal_column("'simple'::regconfig"), normalized).op("||")(
+        func.websearch_to_tsquery(literal_column("'english'::regconfig"), normalized)
+    )
+    rank = func.ts_rank_cd(content.search_vector, ts_query).label("rank")
+
+    columns = SUMMARY_COLUMNS if summary else (content,)
+    query = select(*columns, rank).where(
+        content.user_id == user_id,
+        content.search_vector.op("@@")(ts_query)
+    )
+    if cursor:
+        last_rank, last_id = decode_search_cursor(cursor)
+        query = query.where(tuple_(rank, content.id) < tuple_(last_rank, last_id))
+    # Fetch one extra row to know whether another page exists
+    query = query.order_by(rank.desc(), content.id.desc()).limit(limit + 1)
+
+    rows = (await db.execute(query)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        last_id = last.id if summary else last.GeneratedContent.id
+        next_cursor = encode_search_cursor(last.rank, last_id)
+    return rows, next_cursor
@@ -1,14 +1,82 @@
-from sqlalchemy import create_engine
+import logging
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
-from .config import DATABASE_URL
-from .models import Base  # Import Base from models
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from .config import (
+    DATABASE_URL, ASYNC_DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, ASYNC_DB_POOL_SIZE,
+    ASYNC_DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING
+)
+from .models import Base, GeneratedContent, SEARCH_VECTOR_SQL  # Import Base from models
 
-engine = create_engine(DATABASE_URL)
+# Configure logging
+logger = logging.getLogger(__name__)
+
+pool_options = dict(
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+)
+
+# libpq/psycopg2 query parameters and their asyncpg equivalents (None: no equivalent)
+ASYNCPG_QUERY_PARAMS = {
+    "sslmode": "ssl",
+    "connect_timeout": None,
+    "application_name": None,
+    "options": None,
+    "keepalives": None,
+    "keepalives_idle": None,
+    "keepalives_interval": None,
+    "keepalives_count": None,
+    "client_encoding": None,
+    "gssencmode": None,
+}
+
+def async_database_url(url: str):
+    """asyncpg URL for a psycopg2 DATABASE_URL, translating or dropping libpq-only query parameters"""
+    url = make_url(url)
+    query = dict(url.query)
+    for name, replacement in ASYNCPG_QUERY_PARAMS.items():
+        if name not in query:
+            continue
+        value = query.pop(name)
+        if replacement is None:
+            logger.warning(f"Dropping {name} from the async database URL (not supported by asyncpg)")
+        else:
+            query[replacement] = value
+    return url.set(drivername="postgresql+asyncpg", query=query)
+
+# Sync engine: kept for scripts, migrations and the remaining sync routes
+engine = create_engine(DATABASE_URL, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, **pool_options)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine (asyncpg) used by the async auth and content routes
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL or async_database_url(DATABASE_URL),
+    pool_size=ASYNC_DB_POOL_SIZE,
+    max_overflow=ASYNC_DB_MAX_OVERFLOW,
+    **pool_options
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+def init_db():
+    """Create missing tables, plus columns and indexes added after the tables existed"""
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "ALTER TABLE generatedcontent ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            f"GENERATED ALWAYS AS ({SEARCH_VECTOR_SQL}) STORED"
+        ))
+    for index in GeneratedContent.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
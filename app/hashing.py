@@ -0,0 +1,50 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+from .config import BCRYPT_ROUNDS, HASHER_POOL_SIZE
+from .metrics import register_executor
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Hashes cheaper than BCRYPT_ROUNDS are reported by needs_update() and
+# transparently rehashed on the next successful login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS
+)
+
+# bcrypt releases the GIL, so a small thread pool gives real parallelism while
+# bounding how many hashes can burn CPU at once
+_hasher_pool = ThreadPoolExecutor(max_workers=HASHER_POOL_SIZE, thread_name_prefix="hasher")
+register_executor("hasher", _hasher_pool)
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password and return a new hash if the stored one is outdated"""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+async def hash_password_async(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hasher_pool, hash_password, password)
+
+
+async def verify_and_update_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Run verify_and_update on the hasher pool instead of the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hasher_pool, verify_and_update, plain_password, hashed_password)
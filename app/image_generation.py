@@ -4,7 +4,10 @@ from io import BytesIO
 import urllib.parse
 import time
 import os
+import secrets
 import logging
+from .metrics import upstream_call
+from .config import POLLINATIONS_BASE_URL
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -24,13 +27,14 @@ def generate_image(prompt, width=512, height=512, seed=None):
     """
     try:
         encoded_prompt = urllib.parse.quote(prompt)
-        url = f"https://image.pollinations.ai/prompt/{encoded_prompt}?width={width}&height={height}&nologo=true"
-        if seed:
+        url = f"{POLLINATIONS_BASE_URL}/prompt/{encoded_prompt}?width={width}&height={height}&nologo=true"
+        if seed is not None:
             url += f"&seed={seed}"
         
         logger.info(f"Generating image for prompt: {prompt}")
-        response = requests.get(url, timeout=120)  # Increased timeout
-        response.raise_for_status()
+        with upstream_call("pollinations"):
+            response = requests.get(url, timeout=120)  # Increased timeout
+            response.raise_for_status()
         
         # Create generated_images directory if it doesn't exist
         os.makedirs("generated_images", exist_ok=True)
@@ -67,13 +71,14 @@ def generate_image_bytes(prompt, width=512, height=512, seed=None):
     """
     try:
         encoded_prompt = urllib.parse.quote(prompt)
-        url = f"https://image.pollinations.ai/prompt/{encoded_prompt}?width={width}&height={height}&nologo=true"
-        if seed:
+        url = f"{POLLINATIONS_BASE_URL}/prompt/{encoded_prompt}?width={width}&height={height}&nologo=true"
+        if seed is not None:
             url += f"&seed={seed}"
         
         logger.info(f"Generating image bytes for prompt: {prompt}")
-        response = requests.get(url, timeout=120)
-        response.raise_for_status()
+        with upstream_call("pollinations"):
+            response = requests.get(url, timeout=120)
+            response.raise_for_status()
         
         return response.content
         
@@ -82,4 +87,25 @@ def generate_image_bytes(prompt, width=512, height=512, seed=None):
         raise Exception(f"Network error: {str(e)}")
     except Exception as e:
         logger.error(f"Error in image generation: {e}")
-        raise Exception(f"Image generation failed: {str(e)}")
\ No newline at end of file
+        raise Exception(f"Image generation failed: {str(e)}")
+
+def save_image_bytes(image_bytes, seed=None):
+    """
+    Save generated image bytes under generated_images/
+
+    Args:
+        image_bytes (bytes): Image data
+        seed (int): Seed of the variant, added to the filename
+
+    Returns:
+        str: Filename of the saved image; a random suffix keeps images saved
+        in the same second (even with the same seed) from overwriting each other
+    """
+    timestamp = int(time.time())
+    suffix = secrets.token_hex(4) if seed is None else f"{seed}_{secrets.token_hex(4)}"
+    filename = f"generated_image_{timestamp}_{suffix}.png"
+    os.makedirs("generated_images", exist_ok=True)
+    filepath = os.path.join("generated_images", filename)
+    with open(filepath, "wb") as f:
+        f.write(image_bytes)
+    return filename
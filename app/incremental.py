@@ -0,0 +1,129 @@
+"""
+Incremental text classification for as-you-type checks
+
+The text is split into sentence chunks; each chunk's result is cached by its
+normalised content, so an edit only reclassifies the chunks it touched. The
+verdict is the worst chunk. Chunks are classified independently, which trades
+some cross-sentence context for not rerunning the model on the whole text.
+"""
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+from .config import LIVE_CLASSIFY_MAX_CHUNK, LIVE_CLASSIFY_CACHE_SIZE
+from .load_models import risk_score
+
+# Sentence ends, including the Arabic question mark and comma-free line breaks
+SENTENCE_END = re.compile(r"[.!?؟\n]+")
+
+
+@dataclass
+class Chunk:
+    start: int
+    end: int
+    text: str
+
+
+def split_chunks(text: str, max_chunk: int = LIVE_CLASSIFY_MAX_CHUNK) -> List[Chunk]:
+    """Sentence chunks with their offsets; long sentences are cut at whitespace"""
+    chunks = []
+    position = 0
+    for match in SENTENCE_END.finditer(text + "\n"):
+        end = min(match.end(), len(text))
+        _append_chunk(chunks, text, position, end, max_chunk)
+        position = end
+    return chunks
+
+
+def _append_chunk(chunks: List[Chunk], text: str, start: int, end: int, max_chunk: int):
+    while start < end:
+        stop = end
+        if stop - start > max_chunk:
+            cut = text.rfind(" ", start, start + max_chunk)
+            stop = cut if cut > start else start + max_chunk
+        piece = text[start:stop]
+        if piece.strip():
+            chunks.append(Chunk(start, stop, piece))
+        start = stop
+
+
+def apply_delta(text: str, start: int, end: int, replacement: str) -> str:
+    """Replace text[start:end]; raises ValueError on out-of-range offsets"""
+    if not 0 <= start <= end <= len(text):
+        raise ValueError(f"Delta range {start}:{end} outside text of length {len(text)}")
+    return text[:start] + replacement + text[end:]
+
+
+def _normalise(chunk_text: str) -> str:
+    return " ".join(chunk_text.split())
+
+
+class IncrementalClassifier:
+    """
+    Per-connection chunk cache in front of a text classifier
+
+    Args:
+        classify (callable): Text -> result dict with label and confidence
+        cache_size (int): Cached chunk results kept (LRU); the chunks of the
+            text being classified are kept on top of that
+    """
+
+    def __init__(self, classify: Callable[[str], dict], cache_size: int = LIVE_CLASSIFY_CACHE_SIZE):
+        self.classify = classify
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def pending(self, text: str) -> Tuple[List[Chunk], List[str]]:
+        """Chunks of ``text`` and the normalised chunk texts not in the cache yet"""
+        chunks = split_chunks(text)
+        missing = []
+        for chunk in chunks:
+            key = _normalise(chunk.text)
+            if key not in self._cache and key not in missing:
+                missing.append(key)
+        return chunks, missing
+
+    def run(self, chunks: List[Chunk], missing: List[str]) -> dict:
+        """
+        Classify the missing chunks (blocking) and build the verdict
+
+        ``missing`` may be a slice of what ``pending`` returned; chunks that are
+        neither cached nor in it are reported as pending rather than classified,
+        so only chunks the caller accounted for reach the model. Results for
+        the chunks of the current text are never evicted.
+
+        Returns:
+            dict: ``label``/``confidence``/``model_version`` of the worst
+            classified chunk, ``chunks`` with per-chunk results, the
+            ``reclassified`` count and the number of ``pending`` chunks
+        """
+        current = {_normalise(chunk.text) for chunk in chunks}
+        for key in missing:
+            self._remember(key, self.classify(key), keep=current)
+
+        described = []
+        pending = 0
+        worst: Optional[dict] = None
+        for chunk in chunks:
+            key = _normalise(chunk.text)
+            result = self._cache.get(key)
+            if result is None:
+                pending += 1
+                described.append({"start": chunk.start, "end": chunk.end, "cached": False, "pending": True})
+                continue
+            self._cache.move_to_end(key)
+            described.append({"start": chunk.start, "end": chunk.end, "cached": key not in missing, **result})
+            if worst is None or risk_score(result) > risk_score(worst):
+                worst = result
+
+        verdict = dict(worst or {"label": "APPROPRIATE", "confidence": 1.0})
+        verdict.update(chunks=described, reclassified=len(missing), pending=pending)
+        return verdict
+
+    def _remember(self, key: str, result: dict, keep=frozenset()):
+        self._cache[key] = result
+        self._cache.move_to_end(key)
+        # Evict least recently used entries, skipping those in ``keep``
+        for stale in [k for k in self._cache if k not in keep][:max(0, len(self._cache) - self.cache_size)]:
+            del self._cache[stale]
@@ -6,8 +6,17 @@ from transformers import (
     pipeline
 )
 import torch
+import numpy as np
 from PIL import Image
+import time
+import threading
 import warnings
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from .config import TEXT_MODEL_PATH, IMAGE_MODEL_PATH, FAST_IMAGE_PREPROCESS, ANIMATION_BATCH_SIZE, MODEL_MMAP
+from .metrics import stage_timer, MODEL_VERSION
+from .profiling import torch_trace
+from . import cascade, animation, model_store
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -16,13 +25,73 @@ logger = logging.getLogger(__name__)
 # Suppress warnings for cleaner output
 warnings.filterwarnings("ignore", category=FutureWarning)
 
+# Representative inputs run through a new model version before it goes live
+WARMUP_TEXTS = [
+    "This is a normal text message",
+    "ارتكبت قوات الاحتلال مجزرة جديدة في غزة والعالم صامت",
+    "Thousands marched peacefully to demand an end to the war " * 20,
+]
+WARMUP_IMAGE_SIZES = [(224, 224), (1024, 768)]
+
+@dataclass(frozen=True)
+class TextModel:
+    """Text classifier and its tokenizer, swapped together as one reference"""
+    classifier: Any = None
+    tokenizer: Any = None
+    version: str = "rules"
+
+@dataclass(frozen=True)
+class ImageModel:
+    """Image classifier and its processor, swapped together as one reference"""
+    classifier: Any = None
+    processor: Any = None
+    version: str = "default"
+
+def model_version(model_path: str) -> str:
+    """Version of a model directory: its VERSION file, else name and config mtime"""
+    version_file = os.path.join(model_path, "VERSION")
+    if os.path.exists(version_file):
+        with open(version_file) as f:
+            return f.read().strip()
+    config_file = os.path.join(model_path, "config.json")
+    if os.path.exists(config_file):
+        stamp = time.strftime("%Y%m%d%H%M%S", time.gmtime(os.path.getmtime(config_file)))
+        return f"{os.path.basename(os.path.normpath(model_path))}@{stamp}"
+    return os.path.basename(os.path.normpath(model_path))
+
 class ModelLoader:
+    """
+    Holds the live text and image models
+
+    Each model is an immutable bundle behind a single attribute, so a reload
+    can load and warm a new version in the background and then swap it in
+    with one assignment. Requests take a reference to the bundle when they
+    start and finish on it even if a swap happens meanwhile.
+    """
+
     def __init__(self):
-        self.text_classifier = None
-        self.image_classifier = None
-        self.text_tokenizer = None
-        self.image_processor = None
+        self.text = TextModel()
+        self.image = ImageModel()
+        self.reload_status: Dict[str, dict] = {}
+        self._reload_lock = threading.Lock()
         self.load_models()
+
+    # Read-only accessors kept for existing callers
+    @property
+    def text_classifier(self):
+        return self.text.classifier
+
+    @property
+    def text_tokenizer(self):
+        return self.text.tokenizer
+
+    @property
+    def image_classifier(self):
+        return self.image.classifier
+
+    @property
+    def image_processor(self):
+        return self.image.processor
     
     def load_models(self):
         """Load both text and image classification models"""
@@ -36,43 +105,127 @@ class ModelLoader:
     def load_text_model(self):
         """Load text classification model"""
         try:
-            # First try to load your custom model
-            model_path = "app/models/text_classifier"
-            if os.path.exists(model_path):
-                logger.info(f"Loading custom text model from {model_path}")
-                self.text_tokenizer = AutoTokenizer.from_pretrained(model_path)
-                self.text_classifier = AutoModelForSequenceClassification.from_pretrained(model_path)
-            else:
-                # Fallback to a pre-trained model for content moderation
-                logger.info("Loading fallback text classification model: unitary/toxic-bert")
-                self.text_classifier = pipeline(
-                    "text-classification",
-                    model="unitary/toxic-bert",
-                    tokenizer="unitary/toxic-bert",
-                    return_all_scores=False
-                )
+            self.swap_text(self.build_text_model())
         except Exception as e:
             logger.error(f"Error loading text model: {e}")
             # Use a simple rule-based fallback
-            self.text_classifier = None
+            self.swap_text(TextModel())
     
     def load_image_model(self):
         """Load image classification model"""
         try:
-            # Check if custom model exists
-            model_path = "app/models/image_classifier"
-            if os.path.exists(model_path):
-                logger.info(f"Loading custom image model from {model_path}")
-                self.image_processor = ViTImageProcessor.from_pretrained(model_path)
-                self.image_classifier = ViTForImageClassification.from_pretrained(model_path)
-            else:
-                # Use a pre-trained model for NSFW detection (placeholder)
-                logger.info("Loading fallback image classification model: google/vit-base-patch16-224")
-                self.image_processor = ViTImageProcessor.from_pretrained("google/vit-base-patch16-224")
-                self.image_classifier = ViTForImageClassification.from_pretrained("google/vit-base-patch16-224")
+            self.swap_image(self.build_image_model())
         except Exception as e:
             logger.error(f"Error loading image model: {e}")
-            self.image_classifier = None
+            self.swap_image(ImageModel())
+
+    def build_text_model(self, model_path: str = TEXT_MODEL_PATH, allow_fallback: bool = True) -> TextModel:
+        # First try to load your custom model
+        if os.path.exists(model_path):
+            logger.info(f"Loading custom text model from {model_path}")
+            if MODEL_MMAP and model_store.has_safetensors(model_path):
+                classifier = model_store.load_hf_model(AutoModelForSequenceClassification, model_path)
+            else:
+                classifier = AutoModelForSequenceClassification.from_pretrained(model_path).eval()
+            return TextModel(
+                classifier=classifier,
+                tokenizer=AutoTokenizer.from_pretrained(model_path),
+                version=model_version(model_path)
+            )
+        if not allow_fallback:
+            raise FileNotFoundError(f"Text model directory not found: {model_path}")
+        # Fallback to a pre-trained model for content moderation
+        logger.info("Loading fallback text classification model: unitary/toxic-bert")
+        classifier = pipeline(
+            "text-classification",
+            model="unitary/toxic-bert",
+            tokenizer="unitary/toxic-bert",
+            return_all_scores=False
+        )
+        return TextModel(classifier=classifier, version="unitary/toxic-bert")
+
+    def build_image_model(self, model_path: str = IMAGE_MODEL_PATH, allow_fallback: bool = True) -> ImageModel:
+        # Check if custom model exists
+        if os.path.exists(model_path):
+            logger.info(f"Loading custom image model from {model_path}")
+            if MODEL_MMAP and model_store.has_safetensors(model_path):
+                classifier = model_store.load_hf_model(ViTForImageClassification, model_path)
+            else:
+                classifier = ViTForImageClassification.from_pretrained(model_path).eval()
+            return ImageModel(
+                classifier=classifier,
+                processor=ViTImageProcessor.from_pretrained(model_path),
+                version=model_version(model_path)
+            )
+        if not allow_fallback:
+            raise FileNotFoundError(f"Image model directory not found: {model_path}")
+        # Use a pre-trained model for NSFW detection (placeholder)
+        logger.info("Loading fallback image classification model: google/vit-base-patch16-224")
+        return ImageModel(
+            classifier=ViTForImageClassification.from_pretrained("google/vit-base-patch16-224").eval(),
+            processor=ViTImageProcessor.from_pretrained("google/vit-base-patch16-224"),
+            version="google/vit-base-patch16-224"
+        )
+
+    def swap_text(self, text_model: TextModel):
+        previous, self.text = self.text, text_model
+        MODEL_VERSION.set(0, kind="text", version=previous.version)
+        MODEL_VERSION.set(1, kind="text", version=text_model.version)
+
+    def swap_image(self, image_model: ImageModel):
+        previous, self.image = self.image, image_model
+        MODEL_VERSION.set(0, kind="image", version=previous.version)
+        MODEL_VERSION.set(1, kind="image", version=image_model.version)
+
+    def reload(self, kind: str, model_path: Optional[str] = None) -> bool:
+        """
+        Load, warm and swap in a new model version on a background thread
+
+        Only this process swaps; other uvicorn workers keep serving their
+        current version until they are reloaded too. A missing directory fails
+        the reload and keeps the live model (the hub placeholders are only
+        used for the initial load).
+
+        Args:
+            kind (str): "text" or "image"
+            model_path (str): Directory of the new version (default: configured path)
+
+        Returns:
+            bool: False if a reload is already running
+        """
+        if kind not in ("text", "image"):
+            raise ValueError(f"Unknown model kind: {kind}")
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        self.reload_status[kind] = {"state": "loading", "path": model_path}
+        threading.Thread(target=self._reload, args=(kind, model_path), name=f"reload-{kind}", daemon=True).start()
+        return True
+
+    def _reload(self, kind: str, model_path: Optional[str]):
+        status = self.reload_status[kind]
+        try:
+            start = time.perf_counter()
+            if kind == "text":
+                candidate = self.build_text_model(model_path or TEXT_MODEL_PATH, allow_fallback=False)
+                status["state"] = "warming"
+                for sample in WARMUP_TEXTS:
+                    _classify_text_with(candidate, sample, raise_errors=True)
+                self.swap_text(candidate)
+            else:
+                candidate = self.build_image_model(model_path or IMAGE_MODEL_PATH, allow_fallback=False)
+                status["state"] = "warming"
+                for size in WARMUP_IMAGE_SIZES:
+                    _classify_pil_image(candidate, Image.new("RGB", size, (120, 90, 60)))
+                self.swap_image(candidate)
+            status.update(state="active", version=candidate.version,
+                          seconds=round(time.perf_counter() - start, 3))
+            logger.info(f"Swapped in {kind} model {candidate.version}")
+        except Exception as e:
+            # The previous version stays live
+            logger.error(f"Reloading {kind} model failed: {e}")
+            status.update(state="failed", error=str(e))
+        finally:
+            self._reload_lock.release()
 
 # Global model loader instance
 model_loader = ModelLoader()
@@ -85,23 +238,84 @@ def classify_text(text: str) -> dict:
         text (str): Input text to classify
         
     Returns:
-        dict: Classification result with label and confidence
+        dict: Classification result with label, confidence and model version
+    """
+    # Confident cases are decided by the cheap first stage
+    if cascade.text_cascade is not None:
+        result, _ = cascade.text_cascade.decide(cascade.text_features(text))
+        if result is not None:
+            return result
+
+    # Snapshot the live model so a concurrent hot-swap can't affect this request
+    return _classify_text_with(model_loader.text, text)
+
+def classify_texts(texts) -> list:
+    """
+    Classify several texts, running the custom model once per batch
+
+    Args:
+        texts (list): Input texts
+        
+    Returns:
+        list: One classification result per text, in order
     """
+    results = [None] * len(texts)
+    pending = []
+    for i, text in enumerate(texts):
+        if cascade.text_cascade is not None:
+            result, _ = cascade.text_cascade.decide(cascade.text_features(text))
+            if result is not None:
+                results[i] = result
+                continue
+        pending.append(i)
+
+    text_model = model_loader.text
+    if pending and text_model.tokenizer is not None and isinstance(text_model.classifier, torch.nn.Module):
+        stage = stage_timer("classify_text")
+        try:
+            with stage("tokenize"):
+                inputs = text_model.tokenizer([texts[i] for i in pending], return_tensors="pt",
+                                              truncation=True, padding=True, max_length=512)
+            with stage("forward"), torch_trace("classify_text"), torch.no_grad():
+                outputs = text_model.classifier(**inputs)
+            with stage("postprocess"):
+                predictions = torch.nn.functional.softmax(outputs.logits, dim=-1)
+                confidences, predicted_classes = torch.max(predictions, dim=1)
+            for i, predicted_class, confidence in zip(pending, predicted_classes.tolist(), confidences.tolist()):
+                # Assuming 0 = appropriate, 1 = inappropriate
+                results[i] = {
+                    "label": "INAPPROPRIATE" if predicted_class == 1 else "APPROPRIATE",
+                    "confidence": float(confidence),
+                    "model_version": text_model.version
+                }
+            pending = []
+        except Exception as e:
+            logger.error(f"Error in batched text classification, falling back to single texts: {e}")
+
+    for i in pending:
+        results[i] = _classify_text_with(text_model, texts[i])
+    return results
+
+def _classify_text_with(text_model: TextModel, text: str, raise_errors: bool = False) -> dict:
     try:
-        if model_loader.text_classifier is None:
+        if text_model.classifier is None:
             # Simple rule-based fallback
             inappropriate_keywords = ['spam', 'hate', 'violence', 'explicit', 'criminals', 'kill', 'attack', 'terrorist']
             is_inappropriate = any(keyword in text.lower() for keyword in inappropriate_keywords)
             
             return {
                 "label": "INAPPROPRIATE" if is_inappropriate else "APPROPRIATE",
-                "confidence": 0.8 if is_inappropriate else 0.7
+                "confidence": 0.8 if is_inappropriate else 0.7,
+                "model_version": text_model.version
             }
         
+        stage = stage_timer("classify_text")
+
         # Check if it's a pipeline (HuggingFace) or a custom model
-        if hasattr(model_loader.text_classifier, '__call__') and not isinstance(model_loader.text_classifier, torch.nn.Module):
+        if hasattr(text_model.classifier, '__call__') and not isinstance(text_model.classifier, torch.nn.Module):
             # Using HuggingFace pipeline
-            result = model_loader.text_classifier(text)
+            with stage("forward"), torch_trace("classify_text"):
+                result = text_model.classifier(text)
             
             # Handle different pipeline output formats
             if isinstance(result, list) and len(result) > 0:
@@ -119,24 +333,29 @@ def classify_text(text: str) -> dict:
                 confidence = 0.5
         else:
             # Using custom model
-            inputs = model_loader.text_tokenizer(text, return_tensors="pt", truncation=True, padding=True, max_length=512)
+            with stage("tokenize"):
+                inputs = text_model.tokenizer(text, return_tensors="pt", truncation=True, padding=True, max_length=512)
             
-            with torch.no_grad():
-                outputs = model_loader.text_classifier(**inputs)
-                predictions = torch.nn.functional.softmax(outputs.logits, dim=-1)
+            with stage("forward"), torch_trace("classify_text"), torch.no_grad():
+                outputs = text_model.classifier(**inputs)
             
-            predicted_class = torch.argmax(predictions, dim=1).item()
-            confidence = torch.max(predictions).item()
+            with stage("postprocess"):
+                predictions = torch.nn.functional.softmax(outputs.logits, dim=-1)
+                predicted_class = torch.argmax(predictions, dim=1).item()
+                confidence = torch.max(predictions).item()
             
             # Assuming 0 = appropriate, 1 = inappropriate
             label = "INAPPROPRIATE" if predicted_class == 1 else "APPROPRIATE"
         
         return {
             "label": label,
-            "confidence": float(confidence)
+            "confidence": float(confidence),
+            "model_version": text_model.version
         }
         
     except Exception as e:
+        if raise_errors:
+            raise
         logger.error(f"Error in text classification: {e}")
         # Fallback to rule-based classification
         inappropriate_keywords = ['spam', 'hate', 'violence', 'explicit', 'criminals', 'kill', 'attack', 'terrorist']
@@ -145,6 +364,7 @@ def classify_text(text: str) -> dict:
         return {
             "label": "INAPPROPRIATE" if is_inappropriate else "APPROPRIATE",
             "confidence": 0.8 if is_inappropriate else 0.7,
+            "model_version": "rules",
             "error": str(e)
         }
 
@@ -156,36 +376,262 @@ def classify_image(image_path: str) -> dict:
         image_path (str): Path to the image file
         
     Returns:
-        dict: Classification result with label and confidence
+        dict: Classification result with label, confidence and model version
     """
+    # Snapshot the live model so a concurrent hot-swap can't affect this request
+    image_model = model_loader.image
     try:
-        if model_loader.image_classifier is None:
+        if image_model.classifier is None:
             return {
                 "label": "APPROPRIATE",  # Default to appropriate if no model
                 "confidence": 0.7,
+                "model_version": image_model.version,
                 "message": "Image classifier not available, using default"
             }
         
-        # Load and process image
-        image = Image.open(image_path).convert('RGB')
+        with Image.open(image_path) as header:
+            if animation.is_animated(header):
+                return classify_frames(image_model, animation.sample_frames(header))
         
-        # Resize image if needed
-        if max(image.size) > 224:
-            image.thumbnail((224, 224))
+        # Load and process image
+        with stage_timer("classify_image")("decode"):
+            image = open_image_reduced(image_path, image_model.processor)
         
-        inputs = model_loader.image_processor(images=image, return_tensors="pt")
+        result = _image_cascade(image)
+        if result is not None:
+            return result
+        return _classify_pil_image(image_model, image)
         
-        with torch.no_grad():
-            outputs = model_loader.image_classifier(**inputs)
-            predictions = torch.nn.functional.softmax(outputs.logits, dim=-1)
+    except Exception as e:
+        logger.error(f"Error in image classification: {e}")
+        return {
+            "label": "APPROPRIATE",  # Default to appropriate on error
+            "confidence": 0.7,
+            "error": str(e)
+        }
+
+def classify_images(image_paths) -> list:
+    """
+    Classify several image files with one forward pass for the still images
+
+    Animated images go through frame sampling individually; unreadable files
+    get an ``error`` result instead of failing the batch.
+
+    Args:
+        image_paths (list): Paths to image files
         
-        predicted_class = torch.argmax(predictions, dim=1).item()
-        confidence = torch.max(predictions).item()
+    Returns:
+        list: One classification result per path, in order
+    """
+    image_model = model_loader.image
+    if image_model.classifier is None:
+        return [classify_image(path) for path in image_paths]
+
+    results = [None] * len(image_paths)
+    pending, images = [], []
+    for i, path in enumerate(image_paths):
+        try:
+            with Image.open(path) as header:
+                if animation.is_animated(header):
+                    results[i] = classify_frames(image_model, animation.sample_frames(header))
+                    continue
+            with stage_timer("classify_image")("decode"):
+                image = open_image_reduced(path, image_model.processor)
+            result = _image_cascade(image)
+            if result is not None:
+                results[i] = result
+                continue
+            pending.append(i)
+            images.append(image)
+        except Exception as e:
+            logger.error(f"Error reading image {path}: {e}")
+            results[i] = {"label": "ERROR", "confidence": 0.0, "error": str(e)}
+
+    if images:
+        for i, result in zip(pending, _classify_pil_images(image_model, images)):
+            results[i] = result
+    return results
+
+def classify_decoded_image(image: Image.Image) -> dict:
+    """
+    Classify an image that has already been decoded to RGB
+    
+    An opened animated GIF/WebP is accepted too and gets the worst-frame
+    verdict of its sampled frames, as in classify_image.
+    
+    Args:
+        image (PIL.Image): RGB image, or an animated image; it is not modified
         
+    Returns:
+        dict: Classification result with label, confidence and model version
+    """
+    image_model = model_loader.image
+    try:
+        if image_model.classifier is None:
+            return {
+                "label": "APPROPRIATE",  # Default to appropriate if no model
+                "confidence": 0.7,
+                "model_version": image_model.version,
+                "message": "Image classifier not available, using default"
+            }
+        if animation.is_animated(image):
+            return classify_frames(image_model, animation.sample_frames(image))
+        result = _image_cascade(image)
+        if result is not None:
+            return result
+        return _classify_pil_image(image_model, image.copy())
+    except Exception as e:
+        logger.error(f"Error in image classification: {e}")
+        return {
+            "label": "APPROPRIATE",  # Default to appropriate on error
+            "confidence": 0.7,
+            "error": str(e)
+        }
+
+@dataclass(frozen=True)
+class PreprocessSpec:
+    """Resize target and fused rescale/normalize constants of an image processor"""
+    width: int
+    height: int
+    resample: int
+    scale: np.ndarray   # rescale_factor / std, per channel
+    offset: np.ndarray  # mean / std, per channel
+
+# Specs keyed by processor id; the processor is kept alongside so ids stay valid
+_preprocess_specs: Dict[int, tuple] = {}
+_preprocess_buffers = threading.local()
+
+def _preprocess_spec(processor) -> Optional[PreprocessSpec]:
+    """
+    Fast-path spec for a processor, or None when it can't be reproduced exactly
+
+    Only fixed height/width resizing processors (ViTImageProcessor and friends)
+    qualify; anything else keeps going through the processor itself.
+    """
+    if not FAST_IMAGE_PREPROCESS or processor is None:
+        return None
+    cached = _preprocess_specs.get(id(processor))
+    if cached is not None and cached[0] is processor:
+        return cached[1]
+
+    spec = None
+    size = getattr(processor, "size", None) or {}
+    if getattr(processor, "do_resize", False) and "height" in size and "width" in size:
+        rescale = processor.rescale_factor if getattr(processor, "do_rescale", True) else 1.0
+        if getattr(processor, "do_normalize", True):
+            mean = np.asarray(processor.image_mean, dtype=np.float32)
+            std = np.asarray(processor.image_std, dtype=np.float32)
+        else:
+            mean, std = np.zeros(3, dtype=np.float32), np.ones(3, dtype=np.float32)
+        spec = PreprocessSpec(
+            width=int(size["width"]),
+            height=int(size["height"]),
+            resample=int(getattr(processor, "resample", Image.BILINEAR)),
+            scale=(rescale / std).astype(np.float32),
+            offset=(mean / std).astype(np.float32),
+        )
+    _preprocess_specs[id(processor)] = (processor, spec)
+    return spec
+
+def open_image_reduced(image_path: str, processor=None) -> Image.Image:
+    """
+    Decode an image as RGB, letting JPEGs decode at a reduced DCT scale
+
+    The draft request keeps both sides at or above the processor's target size,
+    so the single resize in fast_pixel_values still downsamples.
+    """
+    image = Image.open(image_path)
+    spec = _preprocess_spec(processor)
+    if spec is not None and image.format == "JPEG":
+        image.draft("RGB", (spec.width, spec.height))
+    return image.convert("RGB")
+
+def fast_pixel_values(spec: PreprocessSpec, image: Image.Image) -> torch.Tensor:
+    """
+    One resize plus a fused rescale/normalize into a per-thread preallocated tensor
+
+    Matches the processor's pixel_values for the same input image; the returned
+    tensor is reused by the next call on this thread.
+    """
+    shape = (1, 3, spec.height, spec.width)
+    buffer = getattr(_preprocess_buffers, "pixel_values", None)
+    if buffer is None or tuple(buffer.shape) != shape:
+        buffer = torch.empty(shape, dtype=torch.float32)
+        _preprocess_buffers.pixel_values = buffer
+
+    _fill_pixel_values(spec, image, buffer[0])
+    return buffer
+
+def batch_pixel_values(spec: PreprocessSpec, images) -> torch.Tensor:
+    """fast_pixel_values for several images, stacked into one freshly allocated batch"""
+    batch = torch.empty((len(images), 3, spec.height, spec.width), dtype=torch.float32)
+    for row, image in zip(batch, images):
+        _fill_pixel_values(spec, image, row)
+    return batch
+
+def _fill_pixel_values(spec: PreprocessSpec, image: Image.Image, target: torch.Tensor):
+    resized = image.resize((spec.width, spec.height), resample=spec.resample)
+    pixels = np.asarray(resized, dtype=np.float32)
+
+    # (H, W, C) -> (C, H, W) view of the output, filled in place
+    out = target.numpy().transpose(1, 2, 0)
+    np.multiply(pixels, spec.scale, out=out)
+    np.subtract(out, spec.offset, out=out)
+
+def _image_cascade(image: Image.Image) -> Optional[dict]:
+    """First-stage verdict for a decoded image, or None to escalate to the ViT"""
+    if cascade.image_cascade is None:
+        return None
+    with stage_timer("classify_image")("cascade"):
+        result, _ = cascade.image_cascade.decide(cascade.image_features(image))
+    return result
+
+def _classify_pil_image(image_model: ImageModel, image: Image.Image) -> dict:
+    """Classify a decoded RGB image with the given model bundle"""
+    stage = stage_timer("classify_image")
+
+    with stage("preprocess"):
+        spec = _preprocess_spec(image_model.processor)
+        if spec is not None:
+            inputs = {"pixel_values": fast_pixel_values(spec, image)}
+        else:
+            # Resize image if needed
+            if max(image.size) > 224:
+                image.thumbnail((224, 224))
+            
+            inputs = image_model.processor(images=image, return_tensors="pt")
+    
+    return _classify_pixel_values(image_model, inputs)[0]
+
+def _classify_pil_images(image_model: ImageModel, images) -> list:
+    """Classify several decoded RGB images in one forward pass"""
+    stage = stage_timer("classify_image")
+
+    with stage("preprocess"):
+        spec = _preprocess_spec(image_model.processor)
+        if spec is not None:
+            inputs = {"pixel_values": batch_pixel_values(spec, images)}
+        else:
+            for image in images:
+                if max(image.size) > 224:
+                    image.thumbnail((224, 224))
+            inputs = image_model.processor(images=list(images), return_tensors="pt")
+    
+    return _classify_pixel_values(image_model, inputs)
+
+def _classify_pixel_values(image_model: ImageModel, inputs) -> list:
+    with stage_timer("classify_image")("forward"), torch_trace("classify_image"), torch.no_grad():
+        outputs = image_model.classifier(**inputs)
+    
+    predictions = torch.nn.functional.softmax(outputs.logits, dim=-1)
+    confidences, predicted_classes = torch.max(predictions, dim=1)
+    
+    results = []
+    for predicted_class, confidence in zip(predicted_classes.tolist(), confidences.tolist()):
         # For now, using a simple rule since we don't have a proper NSFW model
         # In production, you'd want to use a model specifically trained for content moderation
-        if hasattr(model_loader.image_classifier.config, 'id2label'):
-            label_name = model_loader.image_classifier.config.id2label[predicted_class]
+        if hasattr(image_model.classifier.config, 'id2label'):
+            label_name = image_model.classifier.config.id2label[predicted_class]
             # This is a placeholder - you'd implement proper logic based on your model
             inappropriate_classes = ['explicit', 'violence', 'adult', 'weapon']  # Example
             is_inappropriate = any(keyword in label_name.lower() for keyword in inappropriate_classes)
@@ -194,19 +640,72 @@ def classify_image(image_path: str) -> dict:
             # Fallback for custom models without proper labels
             label = "INAPPROPRIATE" if predicted_class == 1 else "APPROPRIATE"
         
-        return {
+        results.append({
             "label": label,
             "confidence": float(confidence),
-            "predicted_class": predicted_class
-        }
-        
-    except Exception as e:
-        logger.error(f"Error in image classification: {e}")
-        return {
-            "label": "APPROPRIATE",  # Default to appropriate on error
-            "confidence": 0.7,
-            "error": str(e)
-        }
+            "predicted_class": predicted_class,
+            "model_version": image_model.version
+        })
+    return results
+
+def is_appropriate(result: dict) -> bool:
+    """Verdict of a text or image classification result, shared by every endpoint"""
+    return result.get("label") == "APPROPRIATE"
+
+def risk_score(result: dict) -> float:
+    """How strongly a result leans inappropriate, for picking the worst frame or chunk"""
+    confidence = float(result.get("confidence", 0.0))
+    return confidence if result.get("label") == "INAPPROPRIATE" else 1.0 - confidence
+
+def classify_frames(image_model: ImageModel, frames, batch_size: int = ANIMATION_BATCH_SIZE) -> dict:
+    """
+    Worst-frame verdict over sampled animation frames
+
+    Frames are pulled from the iterator one batch at a time and classified in a
+    single forward pass; iteration (and therefore decoding) stops after the
+    first batch containing an inappropriate frame.
+
+    Args:
+        image_model (ImageModel): Model bundle snapshot
+        frames: Iterable of (frame index, RGB PIL image)
+        batch_size (int): Frames per forward pass
+
+    Returns:
+        dict: Result of the worst frame plus ``frame_index``, ``frames_analyzed``
+        and ``stopped_early``
+    """
+    frames = iter(frames)
+    worst, worst_index, analyzed = None, None, 0
+    flagged = exhausted = False
+    while not flagged and not exhausted:
+        batch = []
+        for index, frame in frames:
+            # Confident cascade verdicts don't need the ViT
+            result = _image_cascade(frame)
+            if result is None:
+                batch.append((index, frame))
+            else:
+                analyzed += 1
+                if worst is None or risk_score(result) > risk_score(worst):
+                    worst, worst_index = result, index
+                if result["label"] == "INAPPROPRIATE":
+                    flagged = True
+                    break
+            if len(batch) >= batch_size:
+                break
+        else:
+            exhausted = True
+        if batch:
+            results = _classify_pil_images(image_model, [frame for _, frame in batch])
+            analyzed += len(batch)
+            for (index, _), result in zip(batch, results):
+                if worst is None or risk_score(result) > risk_score(worst):
+                    worst, worst_index = result, index
+                flagged = flagged or result["label"] == "INAPPROPRIATE"
+    
+    result = dict(worst or {"label": "APPROPRIATE", "confidence": 0.7, "model_version": image_model.version})
+    result.update(frame_index=worst_index, frames_analyzed=analyzed, stopped_early=flagged and not exhausted)
+    return result
 
 # Test function to verify models are working
 def test_models():
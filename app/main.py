@@ -1,26 +1,135 @@
-from fastapi import FastAPI
+import time
+import asyncio
+import importlib
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import auth, content, generate
-from .database import engine, Base
+from starlette.routing import Match
+from .config import APP_ROLE, INIT_DB_ON_STARTUP
+from .database import async_engine, init_db
 # Import models to ensure they are registered with Base
 from . import models
+from .write_behind import shutdown_content_buffer
+from .metrics import registry, REQUEST_LATENCY, monitor_event_loop
+from .profiling import should_profile, wants_torch_trace, profile_request
 
-Base.metadata.create_all(bind=engine)
+# Routers mounted per worker role. Router modules are imported only when a
+# role mounts them: moderation pulls in torch/transformers/SAM/cv2 and loads
+# the models, generate builds the Groq client.
+ROLES = {
+    "api-only": ("auth", "content", "admin"),
+    "inference": ("auth", "moderation", "admin"),
+    "generation": ("auth", "generate", "images", "admin"),
+    "all": ("auth", "content", "moderation", "generate", "images", "admin"),
+}
 
-app = FastAPI(title="Sawtna API", version="1.0.0")
+def role_routers(role: str) -> list:
+    """Router names for a role, or a comma separated combination of roles"""
+    names = []
+    for part in role.split(","):
+        part = part.strip()
+        if part not in ROLES:
+            raise ValueError(f"Unknown app role {part!r}; expected one of {', '.join(ROLES)}")
+        names.extend(name for name in ROLES[part] if name not in names)
+    return names
 
+def route_template(request: Request) -> str:
+    # Label by route template so path parameters don't explode cardinality
+    route = request.scope.get("route")
+    if route is not None:
+        return route.path
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+def create_app(role: str = APP_ROLE) -> FastAPI:
+    """
+    Build the API for a worker role
 
-app.include_router(auth.router)
-app.include_router(content.router)
-app.include_router(generate.router)
-@app.get("/")
-def read_root():
-    return {"message": "Welcome to Sawtna API", "version": "1.0.0"}
\ No newline at end of file
+    Args:
+        role (str): "api-only" (auth and content history), "inference"
+            (classification and blood detection), "generation" (text and image
+            generation) or "all"; comma separated roles are combined
+
+    Returns:
+        FastAPI: The application
+    """
+    routers = role_routers(role)
+
+    if INIT_DB_ON_STARTUP:
+        init_db()
+
+    app = FastAPI(title="Sawtna API", version="1.0.0")
+    app.state.role = role
+    app.state.routers = routers
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    for name in routers:
+        module = importlib.import_module(f".routers.{name}", __package__)
+        app.include_router(module.router)
+
+    @app.middleware("http")
+    async def record_request_latency(request: Request, call_next):
+        start = time.perf_counter()
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        finally:
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - start,
+                method=request.method,
+                route=route_template(request),
+                status=status_code
+            )
+
+    @app.middleware("http")
+    async def profile_selected_requests(request: Request, call_next):
+        if not should_profile(request.headers):
+            return await call_next(request)
+        with profile_request(f"{request.method} {request.url.path}", wants_torch_trace(request.headers)) as session:
+            response = await call_next(request)
+        response.headers["X-Profile-Id"] = session.profile_id
+        return response
+
+    @app.middleware("http")
+    async def add_rate_limit_headers(request: Request, call_next):
+        response = await call_next(request)
+        headers = getattr(request.state, "rate_limit_headers", None)
+        if headers:
+            response.headers.update(headers)
+        return response
+
+    @app.on_event("startup")
+    async def start_event_loop_monitor():
+        app.state.loop_monitor = asyncio.create_task(monitor_event_loop())
+
+    @app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+    def metrics():
+        return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+    @app.on_event("shutdown")
+    async def flush_pending_content():
+        app.state.loop_monitor.cancel()
+        # Drain write-behind content so a graceful shutdown loses no rows
+        shutdown_content_buffer()
+        await async_engine.dispose()
+
+    @app.get("/")
+    def read_root():
+        return {"message": "Welcome to Sawtna API", "version": "1.0.0", "role": role}
+
+    return app
+
+# `uvicorn app.main:app` serves APP_ROLE, e.g. `APP_ROLE=api-only uvicorn app.main:app`
+app = create_app()
@@ -0,0 +1,230 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition
+
+Counters, gauges and histograms are plain Python objects guarded by a lock;
+recording a sample is a dict lookup and a bisect, so they are cheap enough to
+wrap every inference stage. ``render()`` produces the text served on /metrics.
+Each worker process exposes its own values.
+"""
+import time
+import asyncio
+import threading
+import logging
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    """Gauge set explicitly or computed at scrape time from a callback per label set"""
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+        self._callbacks: Dict[Tuple, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, function: Callable[[], float], **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._callbacks[key] = function
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+            callbacks = list(self._callbacks.items())
+        for key, function in callbacks:
+            try:
+                values[key] = function()
+            except Exception as e:
+                logger.warning(f"Gauge {self.name} callback failed: {e}")
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in values.items()
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._values.items()]
+        lines = self.header()
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels(self.labelnames, key, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {series[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.register(Histogram(
+    "sawtna_request_duration_seconds", "HTTP request latency by route",
+    ["method", "route", "status"]
+))
+INFERENCE_STAGE_LATENCY = registry.register(Histogram(
+    "sawtna_inference_stage_duration_seconds", "Time spent in each stage of an inference path",
+    ["path", "stage"]
+))
+UPSTREAM_LATENCY = registry.register(Histogram(
+    "sawtna_upstream_duration_seconds", "Latency of calls to upstream APIs",
+    ["upstream", "model"]
+))
+UPSTREAM_ERRORS = registry.register(Counter(
+    "sawtna_upstream_errors_total", "Failed calls to upstream APIs",
+    ["upstream", "model"]
+))
+EXECUTOR_QUEUE_DEPTH = registry.register(Gauge(
+    "sawtna_executor_queue_depth", "Tasks waiting for a worker in each executor",
+    ["executor"]
+))
+MODEL_VERSION = registry.register(Gauge(
+    "sawtna_model_version_info", "Loaded model versions (1 = live)",
+    ["kind", "version"]
+))
+EVENT_LOOP_LAG = registry.register(Histogram(
+    "sawtna_event_loop_lag_seconds", "Delay of event loop wakeups beyond the requested sleep",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+))
+
+
+def stage_timer(path: str):
+    """Return a ``stage(name)`` context manager timing stages of one inference path"""
+    def stage(name: str):
+        return INFERENCE_STAGE_LATENCY.time(path=path, stage=name)
+    return stage
+
+
+@contextmanager
+def upstream_call(upstream: str, model: str = ""):
+    """Time an upstream API call and count it as an error if it raises"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        UPSTREAM_ERRORS.inc(upstream=upstream, model=model)
+        raise
+    finally:
+        UPSTREAM_LATENCY.observe(time.perf_counter() - start, upstream=upstream, model=model)
+
+
+def register_executor(name: str, executor):
+    """Expose the pending work queue of a ThreadPoolExecutor as a gauge"""
+    EXECUTOR_QUEUE_DEPTH.set_function(lambda: executor._work_queue.qsize(), executor=name)
+
+
+async def monitor_event_loop(interval: float = 0.5):
+    """Background task sampling how late the event loop wakes up"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - start - interval))
@@ -0,0 +1,207 @@
+"""
+Memory-mapped safetensors weights shared across worker processes
+
+Each uvicorn worker normally holds private copies of the text model, the ViT
+and SAM. Once the checkpoints in app/models/ are converted to safetensors:
+
+    python -m app.model_store prepare
+
+the loaders map the weight files with MAP_PRIVATE and point the model
+parameters straight at the mapping. The weights are never written at
+inference time, so the pages stay clean and every worker shares the same
+page-cache pages.
+
+How this shows up in memory metrics: RSS counts shared pages in every
+process that touches them, so per-worker RSS looks about the same as before
+and the sum of RSS over N workers still grows as N x weights. The real
+footprint is PSS (shared pages split between the processes mapping them) or
+USS (private pages only): with mmap'd weights USS per worker drops by the
+weight size, and total PSS grows by roughly one copy of the weights plus N x
+activations instead of N x (weights + activations).
+benchmarks/rss.py measures this for 1..N workers.
+"""
+import os
+import re
+import sys
+import json
+import logging
+import argparse
+from typing import Dict, Iterable, List
+
+import torch
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+SAFETENSORS_NAME = "model.safetensors"
+
+_DTYPES = {
+    "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+    "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8,
+    "U8": torch.uint8, "BOOL": torch.bool,
+}
+
+
+def mmap_state_dict(path: str) -> Dict[str, torch.Tensor]:
+    """
+    Tensors of a safetensors file as views of one private (copy-on-write) mapping
+
+    Nothing is read up front; pages are faulted in from the page cache on first
+    use and shared with every other process mapping the same file.
+    """
+    with open(path, "rb") as f:
+        header_size = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(header_size))
+    header.pop("__metadata__", None)
+
+    data_start = 8 + header_size
+    storage = torch.UntypedStorage.from_file(path, False, os.path.getsize(path))
+    state_dict = {}
+    for name, info in header.items():
+        dtype = _DTYPES[info["dtype"]]
+        start, end = info["data_offsets"]
+        offset = data_start + start
+        itemsize = torch.empty((), dtype=dtype).element_size()
+        tensor = torch.empty(0, dtype=dtype)
+        if offset % itemsize == 0:
+            tensor.set_(storage, offset // itemsize, info["shape"])
+        else:
+            # Misaligned for its dtype: fall back to a private copy of this tensor
+            raw = torch.empty(0, dtype=torch.uint8).set_(storage, offset, (end - start,))
+            tensor = raw.clone().view(dtype).reshape(info["shape"])
+        state_dict[name] = tensor
+    return state_dict
+
+
+def _allowed_missing(model: torch.nn.Module, allow_missing: Iterable[str]) -> List[str]:
+    """Key patterns that may be absent from a checkpoint: tied weights and the model's own ignore list"""
+    patterns = list(allow_missing)
+    for attribute in ("_keys_to_ignore_on_load_missing", "_tied_weights_keys"):
+        patterns.extend(getattr(model, attribute, None) or ())
+    return patterns
+
+
+def load_mmap_weights(model: torch.nn.Module, path: str, allow_missing: Iterable[str] = ()) -> torch.nn.Module:
+    """
+    Replace the model's parameters with mmap'd tensors from a safetensors file
+
+    The model is usually built without weight init, so a parameter missing
+    from the file would be left as uninitialised memory.
+
+    Args:
+        model (torch.nn.Module): Model to load into
+        path (str): safetensors file
+        allow_missing: Extra regex patterns of keys that may be missing
+
+    Raises:
+        RuntimeError: The file lacks keys that are neither tied nor allowed
+    """
+    state_dict = mmap_state_dict(path)
+    missing, unexpected = model.load_state_dict(state_dict, strict=False, assign=True)
+    patterns = _allowed_missing(model, allow_missing)
+    missing = [key for key in missing if not any(re.search(pattern, key) for pattern in patterns)]
+    if missing:
+        raise RuntimeError(f"{path}: missing weights for {len(missing)} keys, e.g. {missing[:5]}")
+    if hasattr(model, "tie_weights"):
+        model.tie_weights()
+    if unexpected:
+        logger.warning(f"{path}: unexpected keys {unexpected[:5]}")
+    return model.eval()
+
+
+def _skip_init():
+    """Context that skips HF weight init for models about to receive loaded weights"""
+    try:
+        from transformers.modeling_utils import no_init_weights
+        return no_init_weights()
+    except ImportError:
+        from contextlib import nullcontext
+        return nullcontext()
+
+
+def has_safetensors(model_path: str) -> bool:
+    return os.path.exists(os.path.join(model_path, SAFETENSORS_NAME))
+
+
+def load_hf_model(model_class, model_path: str) -> torch.nn.Module:
+    """
+    Build an HF model from its config and mmap its safetensors weights
+
+    Args:
+        model_class: e.g. AutoModelForSequenceClassification or ViTForImageClassification
+        model_path (str): Directory with config.json and model.safetensors
+    """
+    from transformers import AutoConfig
+
+    config = AutoConfig.from_pretrained(model_path)
+    with _skip_init():
+        if hasattr(model_class, "from_config"):
+            model = model_class.from_config(config)
+        else:
+            model = model_class(config)
+    return load_mmap_weights(model, os.path.join(model_path, SAFETENSORS_NAME))
+
+
+# -------------------------
+# Checkpoint preparation
+# -------------------------
+
+def convert_hf_directory(model_path: str, model_class) -> bool:
+    """Rewrite an HF model directory with a single unsharded model.safetensors"""
+    if has_safetensors(model_path):
+        logger.info(f"{model_path}: already has {SAFETENSORS_NAME}")
+        return False
+    model = model_class.from_pretrained(model_path)
+    model.save_pretrained(model_path, safe_serialization=True, max_shard_size="100GB")
+    logger.info(f"{model_path}: wrote {SAFETENSORS_NAME}")
+    return True
+
+
+def convert_torch_checkpoint(checkpoint: str) -> str:
+    """Convert a raw torch state dict checkpoint (e.g. SAM .pth) to .safetensors next to it"""
+    from safetensors.torch import save_file
+
+    output = os.path.splitext(checkpoint)[0] + ".safetensors"
+    if os.path.exists(output):
+        logger.info(f"{output}: already exists")
+        return output
+    state_dict = torch.load(checkpoint, map_location="cpu")
+    if "state_dict" in state_dict and isinstance(state_dict["state_dict"], dict):
+        state_dict = state_dict["state_dict"]
+    # safetensors refuses shared storage; give every tensor its own contiguous copy
+    state_dict = {name: tensor.detach().contiguous().clone() for name, tensor in state_dict.items()}
+    save_file(state_dict, output)
+    logger.info(f"{checkpoint}: wrote {output}")
+    return output
+
+
+def prepare(models_dir: str, text_model_path: str, image_model_path: str):
+    from transformers import AutoModelForSequenceClassification, ViTForImageClassification
+
+    if os.path.isdir(text_model_path):
+        convert_hf_directory(text_model_path, AutoModelForSequenceClassification)
+    if os.path.isdir(image_model_path):
+        convert_hf_directory(image_model_path, ViTForImageClassification)
+    for name in sorted(os.listdir(models_dir)):
+        if name.endswith(".pth"):
+            convert_torch_checkpoint(os.path.join(models_dir, name))
+
+
+def main(argv=None):
+    from .config import TEXT_MODEL_PATH, IMAGE_MODEL_PATH
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    prepare_parser = subparsers.add_parser("prepare", help="Convert checkpoints to safetensors")
+    prepare_parser.add_argument("--models-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "models"))
+    prepare_parser.add_argument("--text-model", default=TEXT_MODEL_PATH)
+    prepare_parser.add_argument("--image-model", default=IMAGE_MODEL_PATH)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    prepare(args.models_dir, args.text_model, args.image_model)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,31 @@
-from sqlalchemy import Column, Integer, String, Boolean, Text, TIMESTAMP, ForeignKey
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import Column, Integer, String, Boolean, Text, TIMESTAMP, Date, ForeignKey, Index, Computed
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
 
+# Arabic diacritics (harakat) and tatweel, stripped before indexing so that
+# vocalised and unvocalised spellings match
+ARABIC_DIACRITICS = "[\u064b-\u0652\u0640]"
+
+def _search_document(config: str, weight_columns) -> str:
+    parts = [
+        f"setweight(to_tsvector('{config}', regexp_replace(coalesce({column}, ''), "
+        f"'{ARABIC_DIACRITICS}', '', 'g')), '{weight}')"
+        for column, weight in weight_columns
+    ]
+    return " || ".join(parts)
+
+_SEARCH_COLUMNS = [("title", "A"), ("text", "B"), ("metadata->>'original_text'", "C")]
+
+# Language-agnostic 'simple' lexemes (Arabic and anything else) plus stemmed
+# English lexemes, kept up to date by Postgres as a stored generated column
+SEARCH_VECTOR_SQL = (
+    _search_document("simple", _SEARCH_COLUMNS) + " || " + _search_document("english", _SEARCH_COLUMNS)
+)
+
 class User(Base):
     __tablename__ = "users"
     
@@ -25,4 +46,26 @@ class GeneratedContent(Base):
     text = Column(Text)
     image_path = Column(Text)
     content_metadata = Column(JSONB, name="metadata")
-    created_at = Column(TIMESTAMP, server_default=func.now())  # ✅ Fixed - use func.now() instead of string
\ No newline at end of file
+    created_at = Column(TIMESTAMP, server_default=func.now())  # ✅ Fixed - use func.now() instead of string
+    search_vector = deferred(Column(TSVECTOR, Computed(SEARCH_VECTOR_SQL, persisted=True)))
+
+    __table_args__ = (
+        # Serves the per-user history (newest first) and its keyset pagination;
+        # the light list-view columns are included so it can be index-only
+        Index(
+            "ix_generatedcontent_user_created_id",
+            user_id, created_at.desc(), id.desc(),
+            postgresql_include=["content_type", "title", "image_path"]
+        ),
+        Index("ix_generatedcontent_search_vector", "search_vector", postgresql_using="gin"),
+    )
+
+class UsageRollup(Base):
+    """Per-user, per-day content counts, maintained on every content insert"""
+    __tablename__ = "usage_rollups"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    content_type = Column(String(50), primary_key=True)
+    kind = Column(String(50), primary_key=True, default="")  # metadata.type, "" when absent
+    count = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,216 @@
+"""
+Opt-in per-request profiling
+
+A request is profiled when it carries ``X-Profile: <PROFILE_TOKEN>`` or is
+picked by ``PROFILE_SAMPLE_RATE``. While it runs, a sampler thread records the
+wall-clock Python stacks of every thread in collapsed ("folded") format,
+ready for flamegraph tools. Sampling is process-wide: the event loop and the
+executor threads are shared, so a request's .folded file also contains
+whatever other requests ran on the worker at the same time (each stack is
+rooted at its thread name). Model code wrapped in ``torch_trace`` additionally
+writes a ``torch.profiler`` Chrome trace when ``X-Profile-Torch: 1`` is sent
+alongside the operator token, or PROFILE_TORCH is enabled; sampled requests
+can't ask for one themselves. torch allows one active profiler per process, so
+a model call that overlaps another trace runs untraced. Artifacts go to
+PROFILE_DIR, which is pruned to the newest PROFILE_MAX_ARTIFACTS files.
+"""
+import os
+import sys
+import time
+import random
+import secrets
+import threading
+import logging
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from .config import PROFILE_TOKEN, PROFILE_SAMPLE_RATE, PROFILE_TORCH, PROFILE_DIR, PROFILE_MAX_ARTIFACTS
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ProfileSession:
+    profile_id: str
+    torch_enabled: bool = False
+    artifacts: List[str] = field(default_factory=list)
+
+
+# torch.profiler refuses to start while another profiler is active
+_torch_profiler_lock = threading.Lock()
+
+_current_profile: contextvars.ContextVar[Optional[ProfileSession]] = contextvars.ContextVar(
+    "current_profile", default=None
+)
+
+
+def _operator_request(headers) -> bool:
+    token = headers.get("x-profile")
+    return bool(token and PROFILE_TOKEN and secrets.compare_digest(token, PROFILE_TOKEN))
+
+
+def should_profile(headers) -> bool:
+    """Operator header with the right token, or random sampling"""
+    if _operator_request(headers):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def wants_torch_trace(headers) -> bool:
+    """PROFILE_TORCH, or X-Profile-Torch on a request that also carries the operator token"""
+    return PROFILE_TORCH or (headers.get("x-profile-torch") == "1" and _operator_request(headers))
+
+
+class StackSampler:
+    """Sample the stacks of all other threads in the process at a fixed wall-clock interval"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write_folded(self, path: str):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _prune():
+    entries = list_artifacts()
+    for entry in entries[PROFILE_MAX_ARTIFACTS:]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, entry["name"]))
+        except OSError as e:
+            logger.warning(f"Failed to prune profile artifact {entry['name']}: {e}")
+
+
+def list_artifacts() -> List[dict]:
+    """Profile artifacts, newest first"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    entries = []
+    for name in os.listdir(PROFILE_DIR):
+        path = os.path.join(PROFILE_DIR, name)
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            entries.append({"name": name, "size": stat.st_size, "modified": stat.st_mtime})
+    entries.sort(key=lambda entry: entry["modified"], reverse=True)
+    return entries
+
+
+def artifact_path(name: str) -> Optional[str]:
+    """Resolve an artifact name inside PROFILE_DIR, refusing path traversal"""
+    if os.path.basename(name) != name:
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+@contextmanager
+def profile_request(label: str, torch_enabled: bool = False):
+    """Profile the enclosed request and write its artifacts on exit"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    safe_label = "".join(c if c.isalnum() else "_" for c in label).strip("_")[:60]
+    session = ProfileSession(
+        profile_id=f"{int(time.time())}_{secrets.token_hex(4)}_{safe_label}",
+        torch_enabled=torch_enabled
+    )
+    token = _current_profile.set(session)
+    sampler = StackSampler()
+    sampler.start()
+    start = time.perf_counter()
+    try:
+        yield session
+    finally:
+        sampler.stop()
+        _current_profile.reset(token)
+        path = os.path.join(PROFILE_DIR, f"{session.profile_id}.folded")
+        sampler.write_folded(path)
+        session.artifacts.insert(0, os.path.basename(path))
+        logger.info(f"Profiled {label} in {time.perf_counter() - start:.3f}s "
+                    f"({sampler.samples} samples): {', '.join(session.artifacts)}")
+        _prune()
+
+
+@contextmanager
+def torch_trace(stage: str):
+    """
+    Record a torch.profiler trace of the enclosed model code for a profiled request
+
+    Profiling never affects the enclosed code: if another trace is running or
+    the profiler fails to start, the code runs without a trace.
+    """
+    session = _current_profile.get()
+    if session is None or not session.torch_enabled:
+        yield
+        return
+    if not _torch_profiler_lock.acquire(blocking=False):
+        logger.info(f"Skipping torch trace for {stage}: another trace is running")
+        yield
+        return
+
+    try:
+        prof = None
+        try:
+            import torch
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            prof = torch.profiler.profile(activities=activities, record_shapes=True)
+            prof.__enter__()
+        except Exception as e:
+            logger.warning(f"Failed to start torch trace for {stage}: {e}")
+            prof = None
+        if prof is None:
+            yield
+            return
+
+        try:
+            yield
+        finally:
+            try:
+                prof.__exit__(None, None, None)
+            except Exception as e:
+                logger.warning(f"Failed to stop torch trace for {stage}: {e}")
+                prof = None
+        if prof is None:
+            return
+        name = f"{session.profile_id}_{stage}.trace.json"
+        try:
+            prof.export_chrome_trace(os.path.join(PROFILE_DIR, name))
+            session.artifacts.append(name)
+        except Exception as e:
+            logger.warning(f"Failed to export torch trace for {stage}: {e}")
+    finally:
+        _torch_profiler_lock.release()
@@ -0,0 +1,215 @@
+"""
+Per-user token-bucket quotas for expensive endpoints
+
+Buckets are keyed by endpoint and JWT subject (client address for anonymous
+calls). A request costs its endpoint's weight, so heavier endpoints allow
+fewer calls from the same budget. The in-process backend is exact for a single
+worker; the Redis backend shares buckets across workers and hosts, and any
+server speaking the Redis protocol with Lua scripting (a local redis-server,
+for instance) can stand in for it during development.
+"""
+import math
+import time
+import logging
+import importlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import HTTPException, Request, status
+from starlette.requests import HTTPConnection
+from jose import JWTError, jwt
+
+from .config import (
+    SECRET_KEY, ALGORITHM, RATE_LIMIT_ENABLED, RATE_LIMIT_CAPACITY, RATE_LIMIT_REFILL_PER_SECOND,
+    RATE_LIMIT_WEIGHTS, RATE_LIMIT_BACKEND, RATE_LIMIT_REDIS_URL, RATE_LIMIT_MAX_KEYS
+)
+from .metrics import registry, Counter
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_DECISIONS = registry.register(Counter(
+    "sawtna_rate_limit_total", "Rate-limited endpoint decisions", ["endpoint", "outcome"]
+))
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    tokens: float        # tokens left after this request (or current, when denied)
+    retry_after: float   # seconds until ``cost`` tokens are available (0 when allowed)
+    reset_after: float   # seconds until the bucket is full again
+
+
+class InProcessBackend:
+    """Token buckets in a bounded LRU dict; exact within one worker process"""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def consume(self, key: str, cost: float, capacity: float, refill_rate: float) -> Decision:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return _decision(allowed, tokens, cost, capacity, refill_rate)
+
+
+# KEYS[1] bucket; ARGV cost, capacity, refill per second. Uses the server clock
+# so workers with skewed clocks agree. Returns {allowed, tokens * 1000}.
+_REDIS_TOKEN_BUCKET = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local cost, capacity, rate = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, math.floor(tokens * 1000)}
+"""
+
+
+class RedisBackend:
+    """Token buckets shared through Redis, updated atomically by a Lua script"""
+
+    def __init__(self, url: str = RATE_LIMIT_REDIS_URL, prefix: str = "sawtna:ratelimit:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the 'redis' package") from e
+        self.prefix = prefix
+        self.client = redis.from_url(url)
+        self.script = self.client.register_script(_REDIS_TOKEN_BUCKET)
+
+    async def consume(self, key: str, cost: float, capacity: float, refill_rate: float) -> Decision:
+        allowed, millitokens = await self.script(keys=[self.prefix + key], args=[cost, capacity, refill_rate])
+        return _decision(bool(allowed), millitokens / 1000, cost, capacity, refill_rate)
+
+
+def _decision(allowed: bool, tokens: float, cost: float, capacity: float, refill_rate: float) -> Decision:
+    retry_after = 0.0 if allowed else max(0.0, cost - tokens) / refill_rate
+    return Decision(allowed, tokens, retry_after, (capacity - tokens) / refill_rate)
+
+
+def create_backend(name: str = RATE_LIMIT_BACKEND):
+    """Backend from its config name, or a ``module:factory`` path for custom ones"""
+    if name == "memory":
+        return InProcessBackend()
+    if name == "redis":
+        return RedisBackend()
+    module_name, _, factory = name.partition(":")
+    return getattr(importlib.import_module(module_name), factory)()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+
+def set_backend(backend):
+    """Swap the backend (e.g. for a local stand-in)"""
+    global _backend
+    _backend = backend
+
+
+def request_subject(request: HTTPConnection) -> str:
+    """JWT subject of the bearer token, else the client address (requests and WebSockets)"""
+    authorization = request.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            subject = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+            if subject:
+                return f"user:{subject}"
+        except JWTError:
+            pass
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+async def enforce_rate_limit(request: Request, endpoint: str, count: int = 1, weight: Optional[float] = None):
+    """
+    Charge the calling user's bucket for `count` requests of the endpoint
+
+    Provides RateLimit-Limit/Remaining/Reset headers (in requests of this endpoint's
+    weight) and raises 429 with Retry-After when the bucket can't cover the cost.
+    Backend failures are logged and the request is let through.
+
+    Args:
+        request (Request): Incoming request, used for the subject and headers
+        endpoint (str): Bucket name, also the key in RATE_LIMIT_WEIGHTS
+        count (int): Number of requests' worth to charge, e.g. image variants
+        weight (float): Cost per request; defaults to RATE_LIMIT_WEIGHTS or 1
+    """
+    if not RATE_LIMIT_ENABLED:
+        return
+    unit = weight if weight is not None else RATE_LIMIT_WEIGHTS.get(endpoint, 1.0)
+    if unit * count > RATE_LIMIT_CAPACITY:
+        # Could never be admitted; don't send the client into a Retry-After loop
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Request exceeds the rate limit capacity ({int(RATE_LIMIT_CAPACITY // unit)} items)"
+        )
+    key = f"{endpoint}:{request_subject(request)}"
+    try:
+        decision = await get_backend().consume(key, unit * count, RATE_LIMIT_CAPACITY, RATE_LIMIT_REFILL_PER_SECOND)
+    except Exception as e:
+        logger.warning(f"Rate limit backend failed, allowing request: {e}")
+        RATE_LIMIT_DECISIONS.inc(endpoint=endpoint, outcome="error")
+        return
+
+    headers = {
+        "RateLimit-Limit": str(int(RATE_LIMIT_CAPACITY // unit)),
+        "RateLimit-Remaining": str(max(0, int(decision.tokens // unit))),
+        "RateLimit-Reset": str(math.ceil(decision.reset_after)),
+    }
+    if not decision.allowed:
+        RATE_LIMIT_DECISIONS.inc(endpoint=endpoint, outcome="limited")
+        headers["Retry-After"] = str(max(1, math.ceil(decision.retry_after)))
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded, try again later",
+            headers=headers
+        )
+    RATE_LIMIT_DECISIONS.inc(endpoint=endpoint, outcome="allowed")
+    # Copied onto the response by the app's middleware, whatever the endpoint returns
+    request.state.rate_limit_headers = headers
+
+
+def rate_limit(endpoint: str, weight: Optional[float] = None):
+    """
+    Dependency enforcing the endpoint's token bucket for the calling user
+
+    Args:
+        endpoint (str): Bucket name, also the key in RATE_LIMIT_WEIGHTS
+        weight (float): Cost per request; defaults to RATE_LIMIT_WEIGHTS or 1
+    """
+    async def dependency(request: Request):
+        await enforce_rate_limit(request, endpoint, weight=weight)
+
+    return dependency
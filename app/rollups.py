@@ -0,0 +1,116 @@
+"""
+Incrementally maintained usage rollups
+
+Every content insert in crud bumps the matching (user, day, content_type,
+kind) counter in ``usage_rollups`` inside the same transaction, so dashboards
+read a handful of rollup rows instead of grouping the whole content table.
+
+Rebuild the rollups from scratch (e.g. after deploying them on an existing
+database) with:
+    python -m app.rollups backfill
+"""
+import sys
+import logging
+from collections import Counter
+from typing import Iterable, List
+
+from sqlalchemy import select, func, text
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.postgresql import insert
+
+from . import models, schemas
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+KIND_MAX_LENGTH = 50
+
+
+def _kind(content: schemas.ContentCreate) -> str:
+    metadata = content.content_metadata or {}
+    return str(metadata.get("type") or "")[:KIND_MAX_LENGTH]
+
+
+def _upsert_statement(contents: Iterable[schemas.ContentCreate]):
+    # Aggregate first: ON CONFLICT cannot touch the same row twice per statement
+    counts = Counter((content.user_id, content.content_type, _kind(content)) for content in contents)
+    if not counts:
+        return None
+    # Sorted keys: concurrent flushes lock the same rollup rows in the same
+    # order, so they queue instead of deadlocking
+    rows = [
+        {"user_id": user_id, "day": func.current_date(), "content_type": content_type,
+         "kind": kind, "count": count}
+        for (user_id, content_type, kind), count in sorted(counts.items())
+    ]
+    stmt = insert(models.UsageRollup).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "day", "content_type", "kind"],
+        set_={"count": models.UsageRollup.count + stmt.excluded.count}
+    )
+
+
+def record_usage(db: Session, contents: Iterable[schemas.ContentCreate]):
+    """Add the contents to the rollups; the caller commits"""
+    stmt = _upsert_statement(contents)
+    if stmt is not None:
+        db.execute(stmt)
+
+
+async def record_usage_async(db: AsyncSession, contents: Iterable[schemas.ContentCreate]):
+    stmt = _upsert_statement(contents)
+    if stmt is not None:
+        await db.execute(stmt)
+
+
+async def get_usage_async(db: AsyncSession, user_id: int, days: int) -> List[models.UsageRollup]:
+    """Rollups of the last ``days`` days including today, by the database's date like the writes"""
+    result = await db.execute(
+        select(models.UsageRollup)
+        .where(models.UsageRollup.user_id == user_id,
+               models.UsageRollup.day >= func.current_date() - (days - 1))
+        .order_by(models.UsageRollup.day.desc(), models.UsageRollup.content_type, models.UsageRollup.kind)
+    )
+    return result.scalars().all()
+
+
+def backfill(db: Session) -> int:
+    """
+    Rebuild all rollups from generatedcontent
+
+    Writers are blocked for the duration (SHARE lock) so no insert can be
+    counted twice or missed while the table is recomputed.
+    """
+    db.execute(text("LOCK TABLE generatedcontent IN SHARE MODE"))
+    db.execute(text("DELETE FROM usage_rollups"))
+    result = db.execute(text(f"""
+        INSERT INTO usage_rollups (user_id, day, content_type, kind, count)
+        SELECT user_id, created_at::date, content_type,
+               left(coalesce(metadata->>'type', ''), {KIND_MAX_LENGTH}), count(*)
+        FROM generatedcontent
+        GROUP BY 1, 2, 3, 4
+    """))
+    db.commit()
+    return result.rowcount
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv != ["backfill"]:
+        print("Usage: python -m app.rollups backfill")
+        return 2
+
+    from .database import SessionLocal, init_db
+    init_db()
+    db = SessionLocal()
+    try:
+        rows = backfill(db)
+    finally:
+        db.close()
+    print(f"Rebuilt {rows} usage rollup rows")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+import secrets
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Request, status
+from fastapi.responses import FileResponse
+from typing import Optional
+from ..config import PROFILE_TOKEN
+from .. import profiling
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+def require_operator(x_admin_token: Optional[str] = Header(None)):
+    # Disabled entirely unless an operator token is configured
+    if not PROFILE_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, PROFILE_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Operator token required")
+
+@router.get("/profiles", dependencies=[Depends(require_operator)])
+def list_profiles():
+    """
+    List captured profile artifacts, newest first
+    """
+    return {"profiles": profiling.list_artifacts()}
+
+@router.get("/profiles/{name}", dependencies=[Depends(require_operator)])
+def get_profile(name: str):
+    """
+    Download a profile artifact (.folded stacks or torch .trace.json)
+    """
+    path = profiling.artifact_path(name)
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found"
+        )
+    return FileResponse(path, filename=name)
+
+
+def require_models(request: Request):
+    # Model endpoints only exist on workers that mount the inference routers
+    if "moderation" not in getattr(request.app.state, "routers", ()):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+
+
+@router.get("/models", dependencies=[Depends(require_operator), Depends(require_models)])
+def get_models():
+    """
+    Live model versions and the state of the latest reload per kind
+    """
+    from ..load_models import model_loader
+    from ..cascade import cascade_stats
+    return {
+        "text": model_loader.text.version,
+        "image": model_loader.image.version,
+        "reloads": model_loader.reload_status,
+        "cascade": cascade_stats()
+    }
+
+@router.post("/models/{kind}/reload", status_code=status.HTTP_202_ACCEPTED,
+             dependencies=[Depends(require_operator), Depends(require_models)])
+def reload_model(kind: str, path: Optional[str] = Body(None, embed=True)):
+    """
+    Load and warm a new model version in the background, then swap it in
+
+    Only the worker that receives this request swaps; with several uvicorn
+    workers the others keep their current version, so send the reload to
+    each of them (or restart them) and check GET /admin/models on each. A
+    path that doesn't exist fails the reload and the live model stays.
+    """
+    from ..load_models import model_loader
+    if kind not in ("text", "image"):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown model kind")
+    if not model_loader.reload(kind, path):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A model reload is already running")
+    return {"status": "loading", "kind": kind}
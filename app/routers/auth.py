@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from .. import schemas, crud
-from ..database import get_db
-from ..config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from ..hashing import verify_and_update_async
+from ..database import get_async_db
+from ..config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, TRUST_TOKEN_CLAIMS
+from ..user_cache import CachedUser, user_cache
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
@@ -21,7 +23,7 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -35,23 +37,42 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         token_data = schemas.TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    
-    user = crud.get_user_by_username(db, username=token_data.username)
+
+    # Tokens carry the user id and active flag, so no DB access is needed
+    if TRUST_TOKEN_CLAIMS and payload.get("uid") is not None:
+        if payload.get("active") is False:
+            raise credentials_exception
+        return CachedUser(id=payload["uid"], username=username, is_active=payload.get("active"))
+
+    user = user_cache.get(token_data.username)
     if user is None:
+        db_user = await crud.get_user_by_username_async(db, username=token_data.username)
+        if db_user is None:
+            raise credentials_exception
+        user = CachedUser.from_model(db_user)
+        user_cache.set(user)
+    if user.is_active is False:
         raise credentials_exception
     return user
 
 @router.post("/signup", response_model=schemas.UserResponse)
-def signup(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_username(db, username=user.username)
-    if db_user:
+async def signup(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await crud.create_user_async(db, user)
+    if not db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
-    
-    return crud.create_user(db, user)
+
+    return db_user
 
 @router.post("/token", response_model=schemas.Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = crud.authenticate_user(db, form_data.username, form_data.password)
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    # bcrypt runs on the hasher pool so a burst of logins doesn't stall the loop
+    user = await crud.get_user_by_username_async(db, form_data.username)
+    if user:
+        valid, new_hash = await verify_and_update_async(form_data.password, user.hashed_password)
+        if not valid:
+            user = None
+        elif new_hash:
+            await crud.update_password_hash_async(db, user, new_hash)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -61,6 +82,7 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": user.username, "uid": user.id, "active": user.is_active is not False},
+        expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
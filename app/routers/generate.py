@@ -1,18 +1,32 @@
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from groq import Groq
 import re
 from typing import Optional
 from ..database import get_db
 from .auth import get_current_user
 from .. import schemas
+from ..config import (
+    TEXT_PROVIDER, GROQ_BASE_URL, HEDGE_ENABLED, HEDGE_DEFAULT_DELAY, HEDGE_MIN_DELAY, HEDGE_MAX_DELAY,
+    MODEL_AVAILABILITY_TTL
+)
+from ..write_behind import get_content_buffer
+from ..rate_limit import rate_limit
+from ..text_generation import MODEL_PRIORITY, GroqProvider, FakeProvider, HedgedCompleter, AvailabilityCache
 
 router = APIRouter(prefix="/generate", tags=["text_generation"])
 
 # Groq client
 GROQ_API_KEY = "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"
-client = Groq(api_key=GROQ_API_KEY)
+provider = FakeProvider() if TEXT_PROVIDER == "fake" else GroqProvider(api_key=GROQ_API_KEY, base_url=GROQ_BASE_URL)
+completer = HedgedCompleter(
+    provider,
+    enabled=HEDGE_ENABLED,
+    default_delay=HEDGE_DEFAULT_DELAY,
+    min_delay=HEDGE_MIN_DELAY,
+    max_delay=HEDGE_MAX_DELAY
+)
+availability = AvailabilityCache(provider, ttl=MODEL_AVAILABILITY_TTL)
 
 # Request body schema
 class TextRequest(BaseModel):
@@ -74,22 +88,17 @@ def detect_language(text: str) -> str:
 
 # Function to find a working model
 def find_working_model():
-    model_priority = [
-        "llama-3.1-8b-instant",
-        "llama-3.1-70b-versatile",
-        "mixtral-8x7b-32768",
-        "gemma2-9b-it",
-        "llama3-8b-8192",
-        "llama3-70b-8192"
-    ]
-    for model in model_priority:
-        try:
-            client.models.retrieve(model)
+    for model in MODEL_PRIORITY:
+        if availability.is_available(model):
             return model
-        except:
-            continue
     return "llama-3.1-8b-instant"
 
+# Working model followed by the next one in priority order, used as the hedge
+def find_candidate_models():
+    model_name = find_working_model()
+    index = MODEL_PRIORITY.index(model_name)
+    return MODEL_PRIORITY[index:index + 2]
+
 # Prompt helpers
 def create_arabic_prompt(input_text: str) -> str:
     return f"""أنت مساعد ذكي ومحايد. أعد صياغة النص التالي ليصبح مناسبًا للتواصل الاجتماعي:
@@ -124,18 +133,17 @@ Rewritten text:"""
 # Sanitize helper
 def sanitize_text_groq(input_text: str) -> str:
     lang = detect_language(input_text)
-    model_name = find_working_model()
+    models = find_candidate_models()
     prompt = create_arabic_prompt(input_text) if lang == "ar" else create_english_prompt(input_text)
 
     try:
-        completion = client.chat.completions.create(
-            model=model_name,
-            messages=[{"role": "user", "content": prompt}],
+        generated_text = completer.complete(
+            models,
+            prompt,
             max_tokens=300,
             temperature=0.3,
             top_p=0.9
         )
-        generated_text = completion.choices[0].message.content
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Groq generation failed: {e}")
 
@@ -152,22 +160,21 @@ def sanitize_text_groq(input_text: str) -> str:
 
     result = cleaned_text
 
-    if lang == "ar":
-        if result and len(result) > 10:
-            for word, masked in SENSITIVE_ARABIC_WORDS.items():
-                result = result.replace(word, masked)
-        else:
-            result = input_text
-            for word, masked in SENSITIVE_ARABIC_WORDS.items():
-                result = result.replace(word, masked)
-    else:
-        for word, masked in SENSITIVE_ENGLISH_WORDS.items():
-            result = result.replace(word, masked)
+    # Fall back to the original Arabic text when the model returned too little
+    if lang == "ar" and not (result and len(result) > 10):
+        result = input_text
+
+    return mask_sensitive_words(result, lang)
 
-    return result
+# Sensitive word masking
+def mask_sensitive_words(text: str, lang: str) -> str:
+    words = SENSITIVE_ARABIC_WORDS if lang == "ar" else SENSITIVE_ENGLISH_WORDS
+    for word, masked in words.items():
+        text = text.replace(word, masked)
+    return text
 
 # Route
-@router.post("/neutralize")
+@router.post("/neutralize", dependencies=[Depends(rate_limit("neutralize"))])
 def neutralize_text(
     request: TextRequest,
     db: Session = Depends(get_db),
@@ -186,6 +193,11 @@ def neutralize_text(
         }
     )
 
+    # Keep persistence off the request path when write-behind is enabled
+    content_buffer = get_content_buffer()
+    if content_buffer is not None and content_buffer.submit(content_data):
+        return {"result": sanitized_text, "content_id": None}
+
     from .. import crud
     db_content = crud.create_content(db, content_data)
 
@@ -0,0 +1,311 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Body, Request
+from fastapi.responses import FileResponse, StreamingResponse
+import io
+import json
+import random
+import asyncio
+import logging
+import time
+from typing import Optional
+from PIL import Image
+from ..config import IMAGE_VARIANTS_MAX, IMAGE_VARIANTS_CONCURRENCY
+from ..image_generation import generate_image_bytes, save_image_bytes
+from ..rate_limit import rate_limit, enforce_rate_limit
+from pathlib import Path
+import base64
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Image generation endpoints; served under /content for existing clients
+router = APIRouter(prefix="/content", tags=["content"])
+
+# -------------------------
+# Image generation
+# -------------------------
+@router.post("/generate-image", dependencies=[Depends(rate_limit("generate-image"))])
+async def generate_image_endpoint(prompt: str = Body(..., embed=True)):
+    """
+    Generate an image based on a text prompt and return as base64
+    
+    Args:
+        prompt (str): Text description for image generation
+        
+    Returns:
+        dict: Generated image data as base64
+    """
+    try:
+        if not prompt or len(prompt.strip()) == 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Prompt cannot be empty"
+            )
+        
+        # Validate prompt length
+        if len(prompt) > 1000:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Prompt is too long (max 1000 characters)"
+            )
+        
+        logger.info(f"Generating image for prompt: {prompt}")
+        
+        # Generate image and get bytes directly
+        image_bytes = generate_image_bytes(prompt.strip())
+        
+        # Validate that we actually got image data
+        if not image_bytes or len(image_bytes) == 0:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Image generation returned empty data"
+            )
+        
+        # Verify it's a valid image by trying to open it
+        try:
+            from PIL import Image
+            import io
+            Image.open(io.BytesIO(image_bytes))
+        except Exception as e:
+            logger.error(f"Generated image is invalid: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Generated image is invalid: {str(e)}"
+            )
+        
+        # Convert to base64
+        image_base64 = base64.b64encode(image_bytes).decode('utf-8')
+        
+        # Also save the image to disk for future reference
+        filename = save_image_bytes(image_bytes)
+        
+        logger.info(f"Image successfully generated and saved as {filename}")
+        
+        return {
+            "prompt": prompt,
+            "filename": filename,
+            "image_data": image_base64,
+            "status": "success"
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in image generation: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Image generation failed: {str(e)}"
+        )
+
+@router.post("/generate-image-base64", dependencies=[Depends(rate_limit("generate-image"))])
+async def generate_image_base64_endpoint(prompt: str = Body(..., embed=True)):
+    """
+    Generate an image and return as base64 encoded string
+    """
+    try:
+        if not prompt or len(prompt.strip()) == 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Prompt cannot be empty"
+            )
+        
+        if len(prompt) > 1000:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Prompt is too long (max 1000 characters)"
+            )
+        
+        logger.info(f"Generating base64 image for prompt: {prompt}")
+        image_bytes = generate_image_bytes(prompt.strip())
+        
+        # Convert to base64
+        image_base64 = base64.b64encode(image_bytes).decode('utf-8')
+        
+        timestamp = int(time.time())
+        filename = f"generated_image_{timestamp}.png"
+        
+        return {
+            "prompt": prompt,
+            "filename": filename,
+            "image_data": image_base64,
+            "status": "success"
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in base64 image generation: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Image generation failed: {str(e)}"
+        )
+
+# Sizes accepted for generated variants
+MIN_IMAGE_SIDE = 64
+MAX_IMAGE_SIDE = 1024
+
+def _generate_variant(prompt: str, seed: int, width: int, height: int) -> dict:
+    """Generate, validate and save one variant; runs in a worker thread"""
+    image_bytes = generate_image_bytes(prompt, width=width, height=height, seed=seed)
+    if not image_bytes:
+        raise ValueError("Image generation returned empty data")
+    Image.open(io.BytesIO(image_bytes)).verify()
+    filename = save_image_bytes(image_bytes, seed=seed)
+    return {
+        "seed": seed,
+        "filename": filename,
+        "url": f"/content/generated-images/{filename}",
+        "image_data": base64.b64encode(image_bytes).decode('utf-8'),
+    }
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/generate-image/variants")
+async def generate_image_variants_endpoint(
+    request: Request,
+    prompt: str = Body(..., embed=True),
+    count: int = Body(IMAGE_VARIANTS_MAX, embed=True),
+    seed: Optional[int] = Body(None, embed=True),
+    width: int = Body(512, embed=True),
+    height: int = Body(512, embed=True)
+):
+    """
+    Generate several seed variants of a prompt concurrently, streamed as Server-Sent Events
+
+    At most IMAGE_VARIANTS_CONCURRENCY variants are requested from the backend at
+    once. Each finished variant is saved to generated_images/ and sent straight
+    away as a "variant" event (index, seed, filename, url, image_data); failed
+    variants send an "error" event, and a final "done" event reports the counts.
+    The rate limit is charged once per variant.
+
+    Args:
+        prompt (str): Text description for image generation
+        count (int): Number of variants (1 to IMAGE_VARIANTS_MAX)
+        seed (int): Seed of the first variant, the others use seed + i; random if omitted
+        width (int): Image width (MIN_IMAGE_SIDE to MAX_IMAGE_SIDE)
+        height (int): Image height (MIN_IMAGE_SIDE to MAX_IMAGE_SIDE)
+
+    Returns:
+        StreamingResponse: text/event-stream of variant, error and done events
+    """
+    if not prompt or len(prompt.strip()) == 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Prompt cannot be empty"
+        )
+    if len(prompt) > 1000:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Prompt is too long (max 1000 characters)"
+        )
+    if not 1 <= count <= IMAGE_VARIANTS_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"count must be between 1 and {IMAGE_VARIANTS_MAX}"
+        )
+    if not (MIN_IMAGE_SIDE <= width <= MAX_IMAGE_SIDE and MIN_IMAGE_SIDE <= height <= MAX_IMAGE_SIDE):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"width and height must be between {MIN_IMAGE_SIDE} and {MAX_IMAGE_SIDE}"
+        )
+    await enforce_rate_limit(request, "generate-image", count=count)
+
+    prompt = prompt.strip()
+    base_seed = seed if seed is not None else random.randint(1, 2**31 - 1 - IMAGE_VARIANTS_MAX)
+    seeds = [base_seed + i for i in range(count)]
+    logger.info(f"Generating {count} image variants for prompt: {prompt}")
+
+    async def events():
+        semaphore = asyncio.Semaphore(IMAGE_VARIANTS_CONCURRENCY)
+
+        async def run(index: int, variant_seed: int):
+            async with semaphore:
+                try:
+                    result = await asyncio.to_thread(_generate_variant, prompt, variant_seed, width, height)
+                    return "variant", {"index": index, **result}
+                except Exception as e:
+                    logger.error(f"Image variant {index} (seed {variant_seed}) failed: {e}")
+                    return "error", {"index": index, "seed": variant_seed, "detail": f"Image generation failed: {str(e)}"}
+
+        tasks = [asyncio.create_task(run(index, variant_seed)) for index, variant_seed in enumerate(seeds)]
+        generated = 0
+        try:
+            for finished in asyncio.as_completed(tasks):
+                event, data = await finished
+                generated += event == "variant"
+                yield _sse(event, data)
+            yield _sse("done", {"prompt": prompt, "generated": generated, "failed": count - generated})
+        finally:
+            # Client went away: variants still waiting for a slot are never requested
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/generated-images/{filename}")
+async def get_generated_image(filename: str):
+    """
+    Serve generated images
+    """
+    image_path = Path("generated_images") / filename
+    
+    if not image_path.exists():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Image not found"
+        )
+    
+    return FileResponse(image_path)
+
+# Debug endpoint
+@router.post("/debug-generate-image", dependencies=[Depends(rate_limit("generate-image"))])
+async def debug_generate_image_endpoint(prompt: str = Body(..., embed=True)):
+    """
+    Debug endpoint to check what's happening with image generation
+    """
+    try:
+        logger.info(f"Debug: Generating image for prompt: {prompt}")
+        
+        # Generate image and get bytes directly
+        image_bytes = generate_image_bytes(prompt.strip())
+        
+        logger.info(f"Debug: Image bytes length: {len(image_bytes) if image_bytes else 0}")
+        
+        # Check if we got any data
+        if not image_bytes or len(image_bytes) == 0:
+            return {
+                "status": "error",
+                "message": "No image data received",
+                "bytes_length": 0
+            }
+        
+        # Try to validate the image
+        try:
+            from PIL import Image
+            import io
+            img = Image.open(io.BytesIO(image_bytes))
+            return {
+                "status": "success",
+                "message": f"Valid image: {img.format}, size: {img.size}",
+                "bytes_length": len(image_bytes),
+                "image_data": base64.b64encode(image_bytes).decode('utf-8')[:100] + "..."  # First 100 chars
+            }
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": f"Invalid image: {str(e)}",
+                "bytes_length": len(image_bytes),
+                "image_data": base64.b64encode(image_bytes).decode('utf-8')[:100] + "..."  # First 100 chars
+            }
+            
+    except Exception as e:
+        logger.error(f"Debug error: {e}")
+        return {
+            "status": "error",
+            "message": f"Exception: {str(e)}",
+            "bytes_length": 0
+        }
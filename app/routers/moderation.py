@@ -0,0 +1,639 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect, status, UploadFile, File, Body, Form
+from fastapi.responses import JSONResponse, FileResponse
+import os
+import tempfile
+import logging
+import time
+import asyncio
+import io
+import json
+from typing import Dict, Any, List, Optional
+from ..load_models import classify_text, classify_image, classify_decoded_image, is_appropriate
+from ..blood_detection import (
+    detect_blood, detect_blood_regions, detect_blood_animated, count_blood_regions, MASK_FORMATS, REDACT_MODES
+)
+from ..animation import is_animated
+from ..rate_limit import (
+    rate_limit, enforce_rate_limit, get_backend, request_subject, RATE_LIMIT_DECISIONS
+)
+from ..incremental import IncrementalClassifier, apply_delta
+from ..config import RATE_LIMIT_ENABLED, LIVE_CLASSIFY_CAPACITY, LIVE_CLASSIFY_REFILL_PER_SECOND
+from ..admission import AdmissionRejected, header_size, decode_rgb, plan
+from pathlib import Path
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Classification and blood detection endpoints; served under /content for existing clients
+router = APIRouter(prefix="/content", tags=["content"])
+
+@router.post("/classify-text", response_model=Dict[str, Any])
+async def check_text(text: str = Body(..., embed=True)) -> JSONResponse:
+    """
+    Check if text content is appropriate
+    """
+    try:
+        if not text or len(text.strip()) == 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Text cannot be empty"
+            )
+        
+        if len(text) > 5000:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Text is too long (max 5000 characters)"
+            )
+        
+        logger.info(f"Classifying text of length: {len(text)}")
+        result = classify_text(text.strip())
+        
+        if result.get("label") == "ERROR":
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Classification failed: {result.get('error', 'Unknown error')}"
+            )
+        
+        # Format response to match what Flutter expects
+        return JSONResponse(
+            status_code=status.HTTP_200_OK,
+            content={
+                "success": True,
+                "isAppropriate": is_appropriate(result),
+                "confidence": result["confidence"],
+                "modelVersion": result.get("model_version"),
+                "message": "Text classification successful"
+            }
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error in text classification: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error during text classification"
+        )
+
+@router.websocket("/classify-text/live")
+async def classify_text_live(websocket: WebSocket):
+    """
+    As-you-type text classification
+
+    Client messages (JSON):
+        {"type": "replace", "text": "..."}                        full text
+        {"type": "delta", "start": 0, "end": 0, "text": "..."}    replace text[start:end]
+    Server messages:
+        {"type": "verdict", "rev": n, "isAppropriate": ..., "confidence": ...,
+         "modelVersion": ..., "chunks": [...], "reclassified": k, "pending": p}
+        {"type": "rate_limited", "rev": n, "retryAfter": seconds}
+        {"type": "error", "detail": "..."}
+
+    Only sentences that changed since the last verdict are reclassified. Edits
+    arriving while a verdict is computed are coalesced into the next one.
+    Every reclassified chunk costs one token from the caller's bucket, shared
+    by all of the user's connections (keyed like the HTTP rate limits: JWT
+    subject, else client address).
+    At most a bucketful of chunks is classified per round, so a large paste
+    produces partial verdicts (``pending`` > 0, those chunks with
+    ``isAppropriate: null``) until all of it has been classified.
+    """
+    await websocket.accept()
+    classifier = IncrementalClassifier(classify_text)
+    bucket_key = f"classify-text-live:{request_subject(websocket)}"
+    state = {"text": "", "rev": 0}
+    changed = asyncio.Event()
+
+    async def publish():
+        try:
+            await publish_verdicts()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Live classification failed: {e}")
+            await websocket.close(code=1011)
+
+    async def publish_verdicts():
+        while True:
+            await changed.wait()
+            changed.clear()
+            text, rev = state["text"], state["rev"]
+            chunks, missing = classifier.pending(text)
+            # Never ask for more than the bucket can hold; the rest of a large
+            # paste is classified in the following rounds
+            batch = missing[:max(1, int(LIVE_CLASSIFY_CAPACITY))]
+            if batch and RATE_LIMIT_ENABLED:
+                try:
+                    decision = await get_backend().consume(
+                        bucket_key, len(batch), LIVE_CLASSIFY_CAPACITY, LIVE_CLASSIFY_REFILL_PER_SECOND
+                    )
+                except Exception as e:
+                    logger.warning(f"Rate limit backend failed, allowing live classification: {e}")
+                    RATE_LIMIT_DECISIONS.inc(endpoint="classify-text-live", outcome="error")
+                    decision = None
+                if decision is not None and not decision.allowed:
+                    RATE_LIMIT_DECISIONS.inc(endpoint="classify-text-live", outcome="limited")
+                    await websocket.send_json({"type": "rate_limited", "rev": rev,
+                                               "retryAfter": round(decision.retry_after, 2)})
+                    # Retry with whatever the text is by then
+                    await asyncio.sleep(decision.retry_after)
+                    changed.set()
+                    continue
+            verdict = await asyncio.to_thread(classifier.run, chunks, batch)
+            if verdict["pending"]:
+                changed.set()
+            await websocket.send_json({
+                "type": "verdict",
+                "rev": rev,
+                "isAppropriate": is_appropriate(verdict),
+                "confidence": verdict.get("confidence"),
+                "modelVersion": verdict.get("model_version"),
+                "chunks": [
+                    {"start": c["start"], "end": c["end"],
+                     "isAppropriate": None if c.get("pending") else is_appropriate(c),
+                     "confidence": c.get("confidence"), "cached": c["cached"]}
+                    for c in verdict["chunks"]
+                ],
+                "reclassified": verdict["reclassified"],
+                "pending": verdict["pending"]
+            })
+
+    publisher = asyncio.create_task(publish())
+    try:
+        while True:
+            raw = await websocket.receive_text()
+            try:
+                message = json.loads(raw)
+                if not isinstance(message, dict):
+                    raise ValueError("Message must be a JSON object")
+                if message.get("type") == "replace":
+                    text = str(message.get("text", ""))
+                elif message.get("type") == "delta":
+                    text = apply_delta(state["text"], int(message["start"]), int(message["end"]),
+                                       str(message.get("text", "")))
+                else:
+                    raise ValueError(f"Unknown message type {message.get('type')!r}")
+                if len(text) > 5000:
+                    raise ValueError("Text is too long (max 5000 characters)")
+            except (KeyError, TypeError, ValueError) as e:
+                await websocket.send_json({"type": "error", "detail": str(e)})
+                continue
+            state["text"] = text
+            state["rev"] += 1
+            changed.set()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Live classification connection failed: {e}")
+        try:
+            await websocket.close(code=1011)
+        except Exception:
+            pass
+    finally:
+        publisher.cancel()
+
+@router.post("/classify-image", response_model=Dict[str, Any], dependencies=[Depends(rate_limit("classify-image"))])
+async def check_image(file: UploadFile = File(...)) -> JSONResponse:
+    """
+    Check if image content is appropriate
+    """
+    temp_file_path = None
+    
+    try:
+        # Validate file
+        if not file.filename:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="No file provided"
+            )
+        
+        # Check file size (10MB limit)
+        content = await file.read()
+        file_size = len(content)
+        
+        if file_size > 10 * 1024 * 1024:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="File size too large (max 10MB)"
+            )
+        
+        # Check file type more flexibly
+        allowed_extensions = ['.jpeg', '.jpg', '.png', '.gif', '.webp', '.bmp']
+        file_extension = os.path.splitext(file.filename.lower())[1]
+        
+        if file_extension not in allowed_extensions:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unsupported file type. Allowed types: {', '.join(allowed_extensions)}"
+            )
+        
+        # Create temporary file with proper extension
+        with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as temp_file:
+            temp_file_path = temp_file.name
+            temp_file.write(content)
+        
+        logger.info(f"Processing image: {file.filename}, size: {file_size} bytes")
+        
+        # Classify image
+        result = classify_image(temp_file_path)
+        
+        if result.get("label") == "ERROR":
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Classification failed: {result.get('error', 'Unknown error')}"
+            )
+        
+        # Format response to match what Flutter expects
+        content = {
+            "success": True,
+            "isAppropriate": is_appropriate(result),
+            "confidence": result["confidence"],
+            "modelVersion": result.get("model_version"),
+            "message": "Image classification successful"
+        }
+        if "frames_analyzed" in result:
+            # Animated image: verdict of the worst sampled frame
+            content.update(
+                frameIndex=result["frame_index"],
+                framesAnalyzed=result["frames_analyzed"],
+                stoppedEarly=result["stopped_early"]
+            )
+        
+        return JSONResponse(status_code=status.HTTP_200_OK, content=content)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error in image classification: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error during image classification"
+        )
+    
+    finally:
+        # Clean up temporary file
+        if temp_file_path and os.path.exists(temp_file_path):
+            try:
+                os.remove(temp_file_path)
+                logger.debug(f"Cleaned up temporary file: {temp_file_path}")
+            except Exception as e:
+                logger.warning(f"Failed to clean up temporary file {temp_file_path}: {e}")
+
+@router.get("/health")
+async def health_check() -> JSONResponse:
+    """
+    Health check endpoint
+    """
+    try:
+        test_result = classify_text("Hello world")
+        
+        return JSONResponse(
+            status_code=status.HTTP_200_OK,
+            content={
+                "status": "healthy",
+                "text_classifier": "working" if test_result.get("label") != "ERROR" else "error",
+                "image_classifier": "loaded",
+                "message": "Content classification service is operational"
+            }
+        )
+    except Exception as e:
+        logger.error(f"Health check failed: {e}")
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={
+                "status": "unhealthy",
+                "error": str(e),
+                "message": "Content classification service is experiencing issues"
+            }
+        )
+    
+# -------------------------
+# Blood detection / segmentation
+# -------------------------
+def _check_blood_file(temp_file_path: str, original_file: str, output: str, redact: Optional[str]) -> dict:
+    """Blood check of a saved upload; blocking, so run it in a worker thread"""
+    from PIL import Image
+    with Image.open(temp_file_path) as image:
+        if is_animated(image):
+            mask_format = output if output in MASK_FORMATS else None
+            render = redact or ("overlay" if output == "overlay" else None)
+            name = os.path.splitext(os.path.basename(temp_file_path))[0]
+            result = detect_blood_animated(image, mask_format=mask_format, output_name=name, render=render)
+            response = {
+                "original_file": original_file,
+                "width": result["width"],
+                "height": result["height"],
+                "scale": result["scale"],
+                "blood_regions_detected": len(result["regions"]),
+                "regions": result["regions"],
+                "frameIndex": result["frame_index"],
+                "framesAnalyzed": result["frames_analyzed"],
+                "framesPrefiltered": result["frames_prefiltered"],
+                "status": "success"
+            }
+            if "processed_path" in result:
+                response["processed_file"] = f"processed_images/{os.path.basename(result['processed_path'])}"
+            return response
+    
+    if output != "overlay" or redact:
+        mask_format = output if output in MASK_FORMATS else None
+        result = detect_blood_regions(temp_file_path, mask_format=mask_format, redact=redact)
+        response = {
+            "original_file": original_file,
+            "width": result["width"],
+            "height": result["height"],
+            "scale": result["scale"],
+            "blood_regions_detected": len(result["regions"]),
+            "regions": result["regions"],
+            "status": "success"
+        }
+        if "processed_path" in result:
+            response["processed_file"] = f"processed_images/{os.path.basename(result['processed_path'])}"
+        return response
+    
+    # Detect blood
+    result = detect_blood(temp_file_path)
+    output_path, num_masks = result["processed_path"], result["regions_detected"]
+    
+    # If detection failed, return the original image
+    if num_masks == 0 and output_path == temp_file_path:
+        logger.warning("Blood detection may have failed, returning original image")
+    
+    # Get just the filename for the response
+    output_filename = os.path.basename(output_path)
+    
+    # The overlay is written at the analysed size; scale < 1 means admission downscaled it
+    return {
+        "original_file": original_file,
+        "processed_file": f"processed_images/{output_filename}",
+        "width": result.get("width"),
+        "height": result.get("height"),
+        "scale": result.get("scale"),
+        "blood_regions_detected": num_masks,
+        "status": "success"
+    }
+
+@router.post("/check-blood", dependencies=[Depends(rate_limit("check-blood"))])
+async def check_blood(file: UploadFile = File(...), output: str = "overlay", redact: Optional[str] = None):
+    """
+    Check for blood regions in an image
+
+    ``output=overlay`` (default) writes a highlighted copy for download.
+    ``output=rle`` / ``output=polygon`` / ``output=boxes`` return the regions as
+    compact JSON instead. ``redact=blur|pixelate`` writes a copy with only the
+    masked pixels inside each region's bounding box blurred or pixelated.
+    """
+    temp_file_path = None
+    
+    if output not in ("overlay", "boxes") + MASK_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported output. Allowed: overlay, boxes, {', '.join(MASK_FORMATS)}"
+        )
+    if redact is not None and redact not in REDACT_MODES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported redact mode. Allowed: {', '.join(REDACT_MODES)}"
+        )
+    
+    try:
+        # Validate file
+        if not file.filename:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="No file provided"
+            )
+        
+        # Check file size (10MB limit)
+        content = await file.read()
+        file_size = len(content)
+        
+        if file_size > 10 * 1024 * 1024:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="File size too large (max 10MB)"
+            )
+        
+        # Check file type
+        allowed_types = ['image/jpeg', 'image/jpg', 'image/png', 'image/gif', 'image/webp']
+        if file.content_type not in allowed_types:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unsupported file type. Allowed types: {', '.join(allowed_types)}"
+            )
+        
+        # Create temporary file
+        with tempfile.NamedTemporaryFile(delete=False, suffix=f"_{file.filename}") as temp_file:
+            temp_file_path = temp_file.name
+            temp_file.write(content)
+        
+        logger.info(f"Processing blood detection for image: {file.filename}")
+        
+        # SAM and admission waits block, so keep them off the event loop
+        return await asyncio.to_thread(_check_blood_file, temp_file_path, file.filename, output, redact)
+        
+    except HTTPException:
+        raise
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in blood detection: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Blood detection failed: {str(e)}"
+        )
+    
+    finally:
+        # Clean up temporary file
+        if temp_file_path and os.path.exists(temp_file_path):
+            try:
+                os.remove(temp_file_path)
+                logger.debug(f"Cleaned up temporary file: {temp_file_path}")
+            except Exception as e:
+                logger.warning(f"Failed to clean up temporary file {temp_file_path}: {e}")
+
+# -------------------------
+# Combined post compliance check
+# -------------------------
+MAX_POST_IMAGES = 10
+
+def _decode_image(content: bytes):
+    """
+    Decode once, within the admission limits; the PIL image feeds ViT and the
+    array feeds the blood check
+
+    Animated GIF/WebP uploads are only opened, and returned without an array:
+    the classifier and the blood check each sample their frames instead.
+    """
+    from PIL import Image
+    width, height = header_size(io.BytesIO(content))
+    scale = plan(width, height)
+    image = Image.open(io.BytesIO(content))
+    if is_animated(image):
+        return image, None
+    image.close()
+    image_rgb = decode_rgb(io.BytesIO(content), scale)
+    return Image.fromarray(image_rgb), image_rgb
+
+def _count_blood_animated(content: bytes) -> dict:
+    """count_blood_regions for an animated upload, over its sampled frames"""
+    from PIL import Image
+    with Image.open(io.BytesIO(content)) as image:
+        result = detect_blood_animated(image, mask_format=None)
+    return {
+        "prefilter_passed": result["frames_prefiltered"] < result["frames_analyzed"],
+        "regions": len(result["regions"]),
+        "frame_index": result["frame_index"],
+    }
+
+async def _timed(function, *args):
+    start = time.perf_counter()
+    # to_thread, unlike run_in_executor, carries the profiling context into the thread
+    result = await asyncio.to_thread(function, *args)
+    return result, round((time.perf_counter() - start) * 1000, 1)
+
+@router.post("/check-post")
+async def check_post(
+    request: Request,
+    text: Optional[str] = Form(None),
+    files: List[UploadFile] = File(default=[]),
+    include_blood: bool = Form(True)
+):
+    """
+    Check a whole post (caption plus images) in one request
+
+    Each image is decoded once; text classification, image classification
+    and the blood prefilter/detection all run concurrently. Animated images
+    are judged on their sampled frames, as in classify-image and check-blood.
+    The post is appropriate only if every component is. The rate limit is
+    charged once per image (once for a text-only post).
+    """
+    start = time.perf_counter()
+    if (not text or not text.strip()) and not files:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide text and/or at least one image"
+        )
+    if text and len(text) > 5000:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Text is too long (max 5000 characters)"
+        )
+    if len(files) > MAX_POST_IMAGES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many images (max {MAX_POST_IMAGES})"
+        )
+    # Each image runs ViT and SAM, so charge the quota per image
+    await enforce_rate_limit(request, "check-post", count=max(1, len(files)))
+
+    allowed_extensions = ['.jpeg', '.jpg', '.png', '.gif', '.webp', '.bmp']
+    uploads = []
+    for file in files:
+        content = await file.read()
+        if len(content) > 10 * 1024 * 1024:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"File {file.filename} too large (max 10MB)"
+            )
+        if os.path.splitext((file.filename or "").lower())[1] not in allowed_extensions:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unsupported file type for {file.filename}. Allowed types: {', '.join(allowed_extensions)}"
+            )
+        uploads.append((file.filename, content))
+
+    async def check_one_image(filename: str, content: bytes) -> dict:
+        try:
+            (image, image_rgb), decode_ms = await _timed(_decode_image, content)
+        except AdmissionRejected as e:
+            raise HTTPException(status_code=e.status_code, detail=f"{filename}: {e}")
+        except Exception as e:
+            logger.error(f"Failed to decode {filename}: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Could not decode image {filename}"
+            )
+        animated = image_rgb is None
+        tasks = [_timed(classify_decoded_image, image)]
+        if include_blood and animated:
+            # The blood check opens its own copy: both seek through the frames concurrently
+            tasks.append(_timed(_count_blood_animated, content))
+        elif include_blood:
+            tasks.append(_timed(count_blood_regions, image_rgb))
+        try:
+            results = await asyncio.gather(*tasks)
+        finally:
+            if animated:
+                image.close()
+        (classification, classify_ms) = results[0]
+        entry = {
+            "filename": filename,
+            "isAppropriate": is_appropriate(classification),
+            "confidence": classification.get("confidence"),
+            "modelVersion": classification.get("model_version"),
+            "timings": {"decode_ms": decode_ms, "classify_ms": classify_ms}
+        }
+        if animated:
+            entry["frameIndex"] = classification.get("frame_index")
+            entry["framesAnalyzed"] = classification.get("frames_analyzed")
+        if include_blood:
+            (blood, blood_ms) = results[1]
+            entry["bloodPrefilterPassed"] = blood["prefilter_passed"]
+            entry["bloodRegions"] = blood["regions"]
+            if animated:
+                entry["bloodFrameIndex"] = blood["frame_index"]
+            entry["timings"]["blood_ms"] = blood_ms
+            entry["isAppropriate"] = entry["isAppropriate"] and blood["regions"] == 0
+        return entry
+
+    async def check_caption():
+        result, classify_ms = await _timed(classify_text, text.strip())
+        return {
+            "isAppropriate": is_appropriate(result),
+            "confidence": result.get("confidence"),
+            "modelVersion": result.get("model_version"),
+            "timings": {"classify_ms": classify_ms}
+        }
+
+    try:
+        tasks = [check_one_image(filename, content) for filename, content in uploads]
+        if text and text.strip():
+            tasks.append(check_caption())
+        results = await asyncio.gather(*tasks)
+    except HTTPException:
+        raise
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in post check: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error during post check"
+        )
+
+    text_result = results[-1] if text and text.strip() else None
+    image_results = results[:len(uploads)]
+    components = image_results + ([text_result] if text_result else [])
+    return {
+        "success": True,
+        "isAppropriate": all(component["isAppropriate"] for component in components),
+        "text": text_result,
+        "images": image_results,
+        "timings": {"total_ms": round((time.perf_counter() - start) * 1000, 1)}
+    }
+
+@router.get("/processed_images/{filename}")
+async def get_processed_image(filename: str):
+    """
+    Serve processed blood detection images
+    """
+    image_path = Path("processed_images") / filename
+    
+    if not image_path.exists():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Processed image not found"
+        )
+    
+    return FileResponse(image_path)
@@ -1,6 +1,6 @@
-from pydantic import BaseModel
-from datetime import datetime
-from typing import Optional, Dict, Any, List
+from pydantic import BaseModel, Field
+from datetime import datetime, date
+from typing import Optional, Dict, Any, List, Union, Literal, Annotated
 
 class UserBase(BaseModel):
     username: str
@@ -40,4 +40,53 @@ class Content(ContentBase):
     created_at: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class ContentSummary(BaseModel):
+    id: int
+    user_id: int
+    content_type: str
+    title: Optional[str] = None
+    image_path: Optional[str] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+# Full and summary pages are separate models told apart by ``fields``; a plain
+# Union of item types would re-validate summary items as Content (its extra
+# columns are all optional) and serialize them with null text and metadata
+class ContentPage(BaseModel):
+    fields: Literal["full"] = "full"
+    items: List[Content]
+    next_cursor: Optional[str] = None
+
+class ContentSummaryPage(BaseModel):
+    fields: Literal["summary"] = "summary"
+    items: List[ContentSummary]
+    next_cursor: Optional[str] = None
+
+class SearchPage(ContentPage):
+    ranks: List[float] = []
+
+class SearchSummaryPage(ContentSummaryPage):
+    ranks: List[float] = []
+
+AnyContentPage = Annotated[Union[ContentPage, ContentSummaryPage], Field(discriminator="fields")]
+AnySearchPage = Annotated[Union[SearchPage, SearchSummaryPage], Field(discriminator="fields")]
+
+class UsageCount(BaseModel):
+    day: date
+    content_type: str
+    kind: str
+    count: int
+
+    class Config:
+        from_attributes = True
+
+class UsageStats(BaseModel):
+    days: int
+    total: int
+    by_content_type: Dict[str, int]
+    by_kind: Dict[str, int]
+    daily: List[UsageCount]
@@ -0,0 +1,239 @@
+import time
+import threading
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+from .metrics import upstream_call, register_executor
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Models tried in order when looking for a working Groq model
+MODEL_PRIORITY = [
+    "llama-3.1-8b-instant",
+    "llama-3.1-70b-versatile",
+    "mixtral-8x7b-32768",
+    "gemma2-9b-it",
+    "llama3-8b-8192",
+    "llama3-70b-8192"
+]
+
+
+class GroqProvider:
+    """Chat completion provider backed by the Groq API"""
+
+    name = "groq"
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None):
+        from groq import Groq
+        self.client = Groq(api_key=api_key, base_url=base_url)
+
+    def is_available(self, model: str) -> bool:
+        try:
+            self.client.models.retrieve(model)
+            return True
+        except Exception:
+            return False
+
+    def complete(self, model: str, prompt: str, max_tokens: int = 300,
+                 temperature: float = 0.3, top_p: float = 0.9) -> str:
+        completion = self.client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            temperature=temperature,
+            top_p=top_p
+        )
+        return completion.choices[0].message.content
+
+
+class FakeProvider:
+    """
+    Deterministic local stand-in for the Groq API
+
+    Every model answers after a fixed latency (or a cycle of latencies, to
+    emulate a slow tail) with the original text from the prompt, so the
+    hedging behaviour can be exercised offline.
+
+    Args:
+        latencies (dict): Seconds per model, either a number or a sequence
+            that is cycled through on successive calls
+        default_latency (float): Latency for models not listed
+        failing_models (list): Models that raise instead of answering
+        responder (callable): Optional ``(model, prompt) -> str`` override
+    """
+
+    name = "fake"
+
+    def __init__(self, latencies: Optional[Dict[str, Union[float, Sequence[float]]]] = None,
+                 default_latency: float = 0.0,
+                 failing_models: Optional[List[str]] = None,
+                 responder: Optional[Callable[[str, str], str]] = None):
+        self.latencies = latencies or {}
+        self.default_latency = default_latency
+        self.failing_models = set(failing_models or [])
+        self.responder = responder
+        self.calls: List[str] = []
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _next_latency(self, model: str) -> float:
+        latency = self.latencies.get(model, self.default_latency)
+        if isinstance(latency, (int, float)):
+            return float(latency)
+        with self._lock:
+            index = self._counters.get(model, 0)
+            self._counters[model] = index + 1
+        return float(latency[index % len(latency)])
+
+    def is_available(self, model: str) -> bool:
+        return model not in self.failing_models
+
+    def complete(self, model: str, prompt: str, **kwargs) -> str:
+        with self._lock:
+            self.calls.append(model)
+        time.sleep(self._next_latency(model))
+        if model in self.failing_models:
+            raise RuntimeError(f"Fake provider: model {model} unavailable")
+        if self.responder:
+            return self.responder(model, prompt)
+        # The prompts end with "<header>\n<original text>\n\n<answer header>"
+        blocks = prompt.strip().split("\n\n")
+        original = blocks[-2] if len(blocks) >= 2 else prompt
+        return original.split("\n", 1)[-1].strip()
+
+
+class AvailabilityCache:
+    """
+    Remembers ``provider.is_available`` answers for ``ttl`` seconds per model
+
+    Each check is an upstream round trip, so without this every request paid
+    one (or several, while models are down) before its completion started.
+    """
+
+    def __init__(self, provider, ttl: float = 30.0):
+        self.provider = provider
+        self.ttl = ttl
+        self._entries: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def is_available(self, model: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(model)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        available = self.provider.is_available(model)
+        if self.ttl > 0:
+            with self._lock:
+                self._entries[model] = (now + self.ttl, available)
+        return available
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class LatencyTracker:
+    """Rolling window of upstream latencies used to derive the hedge delay"""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            data = sorted(self.samples)
+        if not data:
+            return None
+        index = min(len(data) - 1, int(round(q * (len(data) - 1))))
+        return data[index]
+
+
+class HedgedCompleter:
+    """
+    Run a completion and hedge it with a second model if it is slow
+
+    The primary request goes to ``models[0]``. If it has not answered after
+    the hedge delay (the observed p95, clamped to ``[min_delay, max_delay]``,
+    or ``default_delay`` until ``min_samples`` latencies are known), the same
+    prompt is sent to ``models[1]`` and whichever answers first wins. A
+    primary that fails before the delay is not waited out: ``models[1]`` is
+    tried straight away. The losing request cannot be cancelled and simply
+    finishes in the background.
+    """
+
+    def __init__(self, provider, enabled: bool = True, default_delay: float = 2.0,
+                 min_delay: float = 0.2, max_delay: float = 10.0, min_samples: int = 20,
+                 max_workers: int = 8):
+        self.provider = provider
+        self.enabled = enabled
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.tracker = LatencyTracker()
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+        register_executor("hedge", self._executor)
+
+    def hedge_delay(self) -> float:
+        if len(self.tracker.samples) < self.min_samples:
+            return self.default_delay
+        p95 = self.tracker.percentile(0.95)
+        return max(self.min_delay, min(self.max_delay, p95))
+
+    def _timed_complete(self, model: str, prompt: str, **kwargs) -> str:
+        start = time.perf_counter()
+        with upstream_call(self.provider.name, model):
+            result = self.provider.complete(model, prompt, **kwargs)
+        self.tracker.record(time.perf_counter() - start)
+        return result
+
+    def complete(self, models: List[str], prompt: str, **kwargs) -> str:
+        """
+        Complete the prompt with the first model, hedging with the second
+
+        Args:
+            models (list): Candidate models in priority order
+            prompt (str): Prompt to send
+
+        Returns:
+            str: Text of the first successful completion
+        """
+        if not self.enabled or len(models) < 2:
+            return self._timed_complete(models[0], prompt, **kwargs)
+
+        primary = self._executor.submit(self._timed_complete, models[0], prompt, **kwargs)
+        done, _ = wait([primary], timeout=self.hedge_delay())
+        if done and primary.exception() is None:
+            return primary.result()
+
+        self.hedges_fired += 1
+        if done:
+            logger.info(f"{models[0]} failed ({primary.exception()}), falling back to {models[1]}")
+        else:
+            logger.info(f"Hedging slow request to {models[0]} with {models[1]}")
+        hedge = self._executor.submit(self._timed_complete, models[1], prompt, **kwargs)
+
+        pending = {hedge} if done else {primary, hedge}
+        last_error = primary.exception() if done else None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                if future is hedge:
+                    self.hedges_won += 1
+                return result
+        raise last_error
@@ -0,0 +1,79 @@
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from .config import USER_CACHE_TTL, USER_CACHE_MAX_SIZE
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    """Detached snapshot of the user fields the routes need"""
+    id: int
+    username: str
+    full_name: Optional[str] = None
+    is_active: Optional[bool] = True
+    created_at: Optional[datetime] = None
+
+    @classmethod
+    def from_model(cls, user):
+        return cls(
+            id=user.id,
+            username=user.username,
+            full_name=user.full_name,
+            is_active=user.is_active,
+            created_at=user.created_at
+        )
+
+
+class UserIdentityCache:
+    """
+    Short-lived LRU cache of authenticated users keyed by username
+
+    Entries expire after ``ttl`` seconds; ``invalidate`` must be called
+    whenever a user row changes so the next request reloads it.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_size: int = 10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, username: str) -> Optional[CachedUser]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[username]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(username)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, user: CachedUser):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[user.username] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(user.username)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username: str):
+        with self._lock:
+            self._entries.pop(username, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Process-wide cache used by get_current_user
+user_cache = UserIdentityCache(ttl=USER_CACHE_TTL, max_size=USER_CACHE_MAX_SIZE)
@@ -0,0 +1,179 @@
+import time
+import threading
+import logging
+from typing import List
+
+from . import crud, schemas
+from .metrics import registry, Counter, EXECUTOR_QUEUE_DEPTH
+from .config import (
+    WRITE_BEHIND_ENABLED, WRITE_BEHIND_MAX_BATCH, WRITE_BEHIND_FLUSH_INTERVAL, WRITE_BEHIND_MAX_RETRIES
+)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND_DROPPED = registry.register(Counter(
+    "sawtna_write_behind_dropped_rows_total", "Buffered content rows that were never persisted", ["reason"]
+))
+
+
+class ContentWriteBuffer:
+    """
+    Write-behind buffer for GeneratedContent rows
+
+    Rows submitted here are acknowledged immediately and inserted in batches
+    by a background thread, either when ``max_batch`` rows are pending or
+    ``flush_interval`` seconds after the oldest pending row arrived.
+
+    Durability: a row is only persisted once its batch has been committed.
+    A flush that fails for any reason other than an integrity error (dropped
+    connection, failover, pool timeout) is retried ``max_retries`` times with
+    exponential backoff; rows still failing after that are dropped. Every
+    dropped row is counted in ``sawtna_write_behind_dropped_rows_total`` by
+    reason (integrity, retries_exhausted, shutdown_timeout).
+    ``close()`` (called on application shutdown) drains everything still
+    pending, so a graceful shutdown with a reachable database loses nothing.
+    A crash or SIGKILL loses at most the rows buffered since the last flush,
+    i.e. up to ``max_batch`` rows or ``flush_interval`` seconds worth of
+    content, plus a batch being retried.
+
+    Args:
+        session_factory (callable): Returns a new SQLAlchemy session
+        max_batch (int): Flush as soon as this many rows are pending
+        flush_interval (float): Maximum seconds a row waits before flushing
+        max_pending (int): Above this many pending rows ``submit`` refuses,
+            so callers fall back to a synchronous insert
+        max_retries (int): Retries of a batch after a database error
+        retry_backoff (float): Delay before the first retry, doubled each time
+    """
+
+    def __init__(self, session_factory, max_batch: int = 50, flush_interval: float = 1.0,
+                 max_pending: int = 5000, max_retries: int = 3, retry_backoff: float = 0.5):
+        self.session_factory = session_factory
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: List[schemas.ContentCreate] = []
+        self._oldest = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="content-write-behind", daemon=True)
+        self._thread.start()
+
+    def submit(self, content: schemas.ContentCreate) -> bool:
+        """Queue a row; returns False if the buffer is closed or full"""
+        with self._cond:
+            if self._closed or len(self._pending) >= self.max_pending:
+                return False
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.append(content)
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify()
+        return True
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def _take_batch(self) -> List[schemas.ContentCreate]:
+        batch = self._pending[:self.max_batch]
+        del self._pending[:self.max_batch]
+        self._oldest = time.monotonic() if self._pending else None
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if len(self._pending) >= self.max_batch:
+                        break
+                    if self._pending:
+                        remaining = self.flush_interval - (time.monotonic() - self._oldest)
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+                if self._closed and not self._pending:
+                    return
+                batch = self._take_batch()
+            self._write(batch)
+
+    def _write(self, batch: List[schemas.ContentCreate]):
+        for attempt in range(self.max_retries + 1):
+            db = self.session_factory()
+            try:
+                self._insert(db, batch)
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error(f"Write-behind flush failed after {attempt + 1} attempts, "
+                                 f"dropping {len(batch)} rows: {e}")
+                    WRITE_BEHIND_DROPPED.inc(len(batch), reason="retries_exhausted")
+                    return
+                delay = self.retry_backoff * 2 ** attempt
+                logger.warning(f"Write-behind flush of {len(batch)} rows failed, retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+            finally:
+                db.close()
+
+    def _insert(self, db, batch: List[schemas.ContentCreate]):
+        """Insert a batch, row by row if it has integrity errors; ``batch`` shrinks as rows commit"""
+        if crud.create_contents(db, batch) is not None:
+            del batch[:]
+            return
+        # Isolate the offending rows instead of dropping the whole batch
+        logger.warning(f"Batch insert of {len(batch)} rows failed, retrying row by row")
+        while batch:
+            content = batch[0]
+            if crud.create_content(db, content) is None:
+                logger.error(f"Dropping content row for user {content.user_id}: integrity error")
+                WRITE_BEHIND_DROPPED.inc(reason="integrity")
+            # Committed (or dropped): a retry after a later failure must not insert it again
+            del batch[0]
+
+    def close(self, timeout: float = 30.0):
+        """Stop accepting rows and flush everything still pending"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            lost = self.pending()
+            logger.error(f"Write-behind buffer did not drain within {timeout}s, {lost} rows lost")
+            WRITE_BEHIND_DROPPED.inc(lost, reason="shutdown_timeout")
+
+
+# Process-wide buffer, created on first use when write-behind is enabled
+_content_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_content_buffer():
+    """Return the shared write-behind buffer, or None if it is disabled"""
+    global _content_buffer
+    if not WRITE_BEHIND_ENABLED:
+        return None
+    with _buffer_lock:
+        if _content_buffer is None:
+            from .database import SessionLocal
+            _content_buffer = ContentWriteBuffer(
+                SessionLocal,
+                max_batch=WRITE_BEHIND_MAX_BATCH,
+                flush_interval=WRITE_BEHIND_FLUSH_INTERVAL,
+                max_retries=WRITE_BEHIND_MAX_RETRIES
+            )
+            EXECUTOR_QUEUE_DEPTH.set_function(_content_buffer.pending, executor="content_write_behind")
+        return _content_buffer
+
+
+def shutdown_content_buffer():
+    """Drain the shared buffer; called from the application shutdown hook"""
+    global _content_buffer
+    with _buffer_lock:
+        buffer, _content_buffer = _content_buffer, None
+    if buffer is not None:
+        buffer.close()
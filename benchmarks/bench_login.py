@@ -0,0 +1,73 @@
+"""
+Login throughput benchmark for the bcrypt hasher pool
+
+Compares verifying passwords inline on the event loop (the old behaviour of
+/auth/token) with offloading to the hasher pool, and measures how long a
+trivial coroutine has to wait while the burst is in flight.
+
+Usage:
+    python -m benchmarks.bench_login --logins 32 --rounds 12
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+
+async def _probe_loop_lag(stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.005)
+        samples.append(time.perf_counter() - start - 0.005)
+
+
+async def _run(mode: str, logins: int, hashed: str):
+    from app import hashing
+
+    samples = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_probe_loop_lag(stop, samples))
+    await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    if mode == "inline":
+        for _ in range(logins):
+            hashing.verify_and_update("password123", hashed)
+            await asyncio.sleep(0)
+    else:
+        await asyncio.gather(*[
+            hashing.verify_and_update_async("password123", hashed) for _ in range(logins)
+        ])
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await probe
+    return {
+        "mode": mode,
+        "logins_per_sec": logins / elapsed,
+        "max_loop_lag_ms": max(samples, default=0.0) * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=12)
+    args = parser.parse_args(argv)
+
+    # BCRYPT_ROUNDS is read when app.hashing is imported
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    from app import hashing
+
+    hashed = hashing.hash_password("password123")
+    print(f"bcrypt rounds={args.rounds}, hasher pool size={hashing.HASHER_POOL_SIZE}")
+    for mode in ("inline", "pool"):
+        result = asyncio.run(_run(mode, args.logins, hashed))
+        print(f"{result['mode']:>6}: {result['logins_per_sec']:8.1f} logins/s, "
+              f"max event-loop lag {result['max_loop_lag_ms']:8.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+Local stand-ins for the Groq chat completions API and image.pollinations.ai
+
+Both fakes answer after a latency drawn from a log-normal distribution
+(configurable median and spread) and fail a configurable fraction of calls
+with HTTP 503, so the API can be load tested without touching the real
+upstreams. Point the app at them with:
+
+    GROQ_BASE_URL=http://127.0.0.1:9100 POLLINATIONS_BASE_URL=http://127.0.0.1:9100
+
+Usage:
+    python -m benchmarks.fake_upstreams --port 9100 \\
+        --groq-latency-ms 400 --groq-sigma 0.6 --groq-error-rate 0.02 \\
+        --pollinations-latency-ms 3000 --pollinations-error-rate 0.05
+"""
+import io
+import sys
+import time
+import random
+import asyncio
+import argparse
+from dataclasses import dataclass
+from functools import lru_cache
+
+
+@dataclass
+class LatencyProfile:
+    median_ms: float
+    sigma: float = 0.5
+    error_rate: float = 0.0
+
+    def sample_seconds(self, rng: random.Random) -> float:
+        # Log-normal around the median: heavy right tail like real upstreams
+        return rng.lognormvariate(0.0, self.sigma) * self.median_ms / 1000
+
+    def should_fail(self, rng: random.Random) -> bool:
+        return rng.random() < self.error_rate
+
+
+@lru_cache(maxsize=16)
+def _png(width: int, height: int) -> bytes:
+    from PIL import Image
+
+    image = Image.new("RGB", (width, height), (27, 94, 32))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def create_app(groq: LatencyProfile, pollinations: LatencyProfile, seed: int = 0):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, Response
+
+    app = FastAPI(title="Sawtna fake upstreams")
+    rng = random.Random(seed)
+    stats = {"groq": 0, "groq_errors": 0, "pollinations": 0, "pollinations_errors": 0}
+
+    async def delay_or_fail(name: str, profile: LatencyProfile):
+        stats[name] += 1
+        await asyncio.sleep(profile.sample_seconds(rng))
+        if profile.should_fail(rng):
+            stats[f"{name}_errors"] += 1
+            return JSONResponse(status_code=503, content={"error": {"message": f"fake {name} failure"}})
+        return None
+
+    @app.get("/openai/v1/models/{model}")
+    async def retrieve_model(model: str):
+        return {"id": model, "object": "model", "created": 0, "owned_by": "fake"}
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        error = await delay_or_fail("groq", groq)
+        if error is not None:
+            return error
+        prompt = body["messages"][-1]["content"]
+        # Answer with the original text block of the prompt, like FakeProvider
+        blocks = prompt.strip().split("\n\n")
+        original = blocks[-2] if len(blocks) >= 2 else prompt
+        text = original.split("\n", 1)[-1].strip()
+        return {
+            "id": f"chatcmpl-fake-{stats['groq']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": len(text.split()),
+                      "total_tokens": len(prompt.split()) + len(text.split())},
+        }
+
+    @app.get("/prompt/{prompt:path}")
+    async def pollinations_image(prompt: str, width: int = 512, height: int = 512):
+        error = await delay_or_fail("pollinations", pollinations)
+        if error is not None:
+            return error
+        return Response(content=_png(width, height), media_type="image/png")
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--groq-latency-ms", type=float, default=400)
+    parser.add_argument("--groq-sigma", type=float, default=0.5)
+    parser.add_argument("--groq-error-rate", type=float, default=0.0)
+    parser.add_argument("--pollinations-latency-ms", type=float, default=3000)
+    parser.add_argument("--pollinations-sigma", type=float, default=0.5)
+    parser.add_argument("--pollinations-error-rate", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    import uvicorn
+
+    app = create_app(
+        LatencyProfile(args.groq_latency_ms, args.groq_sigma, args.groq_error_rate),
+        LatencyProfile(args.pollinations_latency_ms, args.pollinations_sigma, args.pollinations_error_rate),
+        seed=args.seed,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+Offline stand-ins for the benchmark suite
+
+Tiny randomly initialised XLM-R and ViT models, a stubbed SAM mask generator
+and synthetic texts/images. Nothing here touches the network or the real
+checkpoints in app/models/, so timings measure our own code paths plus a
+transformer forward of fixed (small) size.
+"""
+import os
+import random
+
+import numpy as np
+
+SEED = 1234
+
+# Paths that never exist, so importing the app can't load real checkpoints
+MISSING_MODEL_DIR = os.path.join(os.sep, "nonexistent", "sawtna-bench")
+
+
+def offline_environment():
+    """
+    Point the app away from the network and app/models/; call before importing it
+
+    Without this, importing load_models on a machine with the real checkpoints
+    loads (or mmaps) the full XLM-R/ViT before install_stubs replaces them.
+    The cascade is disabled too, so a trained first stage can't answer
+    confident inputs and hide the transformer path being measured.
+    """
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+    os.environ["TEXT_PROVIDER"] = "fake"
+    os.environ["TEXT_MODEL_PATH"] = os.path.join(MISSING_MODEL_DIR, "text_classifier")
+    os.environ["IMAGE_MODEL_PATH"] = os.path.join(MISSING_MODEL_DIR, "image_classifier")
+    os.environ["MODEL_MMAP"] = "false"
+    os.environ["CASCADE_ENABLED"] = "false"
+
+
+ENGLISH_TEXTS = [
+    "This is a normal text message about the weather today",
+    "The occupation forces carried out a massacre in the city and the world is silent",
+    "Thousands marched peacefully to demand an end to the war crimes and genocide",
+    "Families gathered for dinner and shared stories about their grandparents",
+    "Reports describe ethnic cleansing and apartheid policies by Israeli settlers",
+]
+
+ARABIC_TEXTS = [
+    "هذا نص عادي عن الطقس في المدينة اليوم",
+    "ارتكبت قوات الاحتلال مجزرة جديدة في غزة والعالم صامت",
+    "خرج الآلاف في مسيرة سلمية للمطالبة بوقف الإبادة الجماعية",
+    "اجتمعت العائلة على العشاء وتبادلت القصص عن الأجداد",
+    "الجيش الإسرائيلي يواصل التطهير العرقي وجرائم الحرب",
+]
+
+
+def synthetic_texts(count: int = 50, seed: int = SEED):
+    """Mixed Arabic/English texts of varying length"""
+    rng = random.Random(seed)
+    pool = ENGLISH_TEXTS + ARABIC_TEXTS
+    return [" ".join(rng.choice(pool) for _ in range(rng.randint(1, 6))) for _ in range(count)]
+
+
+def synthetic_images(directory: str, sizes=((640, 480), (1280, 960)), count: int = 4, seed: int = SEED):
+    """Write noisy JPEG/PNG images with a red blob and return their paths"""
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index in range(count):
+        width, height = sizes[index % len(sizes)]
+        pixels = rng.integers(0, 255, size=(height, width, 3), dtype=np.uint8)
+        y, x = height // 4, width // 4
+        pixels[y:y * 2, x:x * 2] = (180, 20, 20)
+        ext = ".jpg" if index % 2 == 0 else ".png"
+        path = os.path.join(directory, f"synthetic_{index}{ext}")
+        Image.fromarray(pixels).save(path)
+        paths.append(path)
+    return paths
+
+
+def tiny_text_model(texts):
+    """Word-level tokenizer plus a 2-layer XLM-R classifier"""
+    import torch
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    from transformers import PreTrainedTokenizerFast, XLMRobertaConfig, XLMRobertaForSequenceClassification
+
+    vocab = {"<pad>": 0, "<s>": 1, "</s>": 2, "<unk>": 3}
+    for text in texts:
+        for word in text.split():
+            vocab.setdefault(word, len(vocab))
+
+    backend = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    backend.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=backend, unk_token="<unk>", pad_token="<pad>", bos_token="<s>", eos_token="</s>"
+    )
+
+    torch.manual_seed(SEED)
+    config = XLMRobertaConfig(
+        vocab_size=len(vocab), hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+        intermediate_size=64, max_position_embeddings=516, num_labels=2, pad_token_id=0
+    )
+    return tokenizer, XLMRobertaForSequenceClassification(config).eval()
+
+
+def tiny_image_model(image_size: int = 32):
+    """2-layer ViT classifier and a matching image processor"""
+    import torch
+    from transformers import ViTConfig, ViTForImageClassification, ViTImageProcessor
+
+    torch.manual_seed(SEED)
+    config = ViTConfig(
+        image_size=image_size, patch_size=8, hidden_size=32, num_hidden_layers=2,
+        num_attention_heads=2, intermediate_size=64, num_labels=2
+    )
+    processor = ViTImageProcessor(size={"height": image_size, "width": image_size})
+    return processor, ViTForImageClassification(config).eval()
+
+
+class FakeMaskGenerator:
+    """Stands in for SamAutomaticMaskGenerator: random rectangular masks"""
+
+    def __init__(self, masks_per_image: int = 40, seed: int = SEED):
+        self.masks_per_image = masks_per_image
+        self.seed = seed
+
+    def generate(self, image_rgb):
+        rng = np.random.default_rng(self.seed)
+        height, width = image_rgb.shape[:2]
+        masks = []
+        for _ in range(self.masks_per_image):
+            y0, x0 = rng.integers(0, height // 2), rng.integers(0, width // 2)
+            y1, x1 = y0 + rng.integers(8, height // 2), x0 + rng.integers(8, width // 2)
+            segmentation = np.zeros((height, width), dtype=bool)
+            segmentation[y0:y1, x0:x1] = True
+            masks.append({
+                "segmentation": segmentation,
+                "area": int(segmentation.sum()),
+                "bbox": [int(x0), int(y0), int(x1 - x0), int(y1 - y0)],
+                "predicted_iou": float(rng.uniform(0.8, 1.0)),
+                "stability_score": float(rng.uniform(0.8, 1.0)),
+            })
+        return masks
+
+
+def install_stubs(texts):
+    """Swap the app's models for the tiny offline ones"""
+    from app import load_models, blood_detection
+
+    tokenizer, text_model = tiny_text_model(texts)
+    processor, image_model = tiny_image_model()
+    load_models.model_loader.swap_text(
+        load_models.TextModel(classifier=text_model, tokenizer=tokenizer, version="tiny-xlmr")
+    )
+    load_models.model_loader.swap_image(
+        load_models.ImageModel(classifier=image_model, processor=processor, version="tiny-vit")
+    )
+
+    blood_detection._sam_model = object()
+    blood_detection._mask_generator = FakeMaskGenerator()
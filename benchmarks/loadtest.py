@@ -0,0 +1,210 @@
+"""
+End-to-end load generator for the Sawtna API
+
+Each virtual user signs up once, then loops over the scenario steps until the
+test duration is over. Latency and errors are recorded per endpoint and
+reported as p50/p95/p99 and requests per second. Run the API against the
+local fakes (see fake_upstreams.py) to keep Groq and pollinations out of the
+measurement.
+
+Scenarios are comma separated step names, or a JSON file with a list of
+steps ({"step": "classify_text", "repeat": 3}). Available steps: login,
+classify_text, classify_image, check_blood, neutralize, generate_image,
+user_content.
+
+Usage:
+    python -m benchmarks.loadtest --base-url http://127.0.0.1:8000 \\
+        --users 20 --duration 60 --scenario login,classify_text,neutralize,generate_image
+"""
+import io
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from collections import defaultdict
+from typing import Dict, List
+
+TEXTS = [
+    "The occupation forces carried out a massacre in the city",
+    "Families gathered for dinner and shared stories about their grandparents",
+    "ارتكبت قوات الاحتلال مجزرة جديدة في غزة",
+    "اجتمعت العائلة على العشاء وتبادلت القصص",
+]
+
+PROMPTS = ["olive trees at sunset", "a peaceful protest with flags", "children flying kites by the sea"]
+
+
+def synthetic_png(width: int = 640, height: int = 480, seed: int = 0) -> bytes:
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 255, size=(height, width, 3), dtype=np.uint8)
+    pixels[height // 4:height // 2, width // 4:width // 2] = (180, 20, 20)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, endpoint: str, seconds: float, ok: bool):
+        self.latencies[endpoint].append(seconds)
+        if not ok:
+            self.errors[endpoint] += 1
+
+    def report(self, elapsed: float) -> List[dict]:
+        rows = []
+        for endpoint, values in sorted(self.latencies.items()):
+            values = sorted(values)
+
+            def pct(q):
+                return values[min(len(values) - 1, int(round(q * (len(values) - 1))))] * 1000
+
+            rows.append({
+                "endpoint": endpoint,
+                "requests": len(values),
+                "errors": self.errors[endpoint],
+                "rps": len(values) / elapsed,
+                "p50_ms": pct(0.50),
+                "p95_ms": pct(0.95),
+                "p99_ms": pct(0.99),
+            })
+        return rows
+
+
+class VirtualUser:
+    def __init__(self, client, recorder: Recorder, index: int, image: bytes):
+        self.client = client
+        self.recorder = recorder
+        self.username = f"load_{int(time.time())}_{index}"
+        self.password = "load-test-password"
+        self.token = None
+        self.image = image
+        self.rng = random.Random(index)
+
+    async def request(self, endpoint: str, method: str, url: str, **kwargs):
+        headers = kwargs.pop("headers", {})
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=headers, **kwargs)
+            ok = response.status_code < 400
+        except Exception:
+            response, ok = None, False
+        self.recorder.record(endpoint, time.perf_counter() - start, ok)
+        return response
+
+    async def signup(self):
+        await self.request("POST /auth/signup", "POST", "/auth/signup",
+                           json={"username": self.username, "password": self.password})
+
+    async def login(self):
+        response = await self.request("POST /auth/token", "POST", "/auth/token",
+                                      data={"username": self.username, "password": self.password})
+        if response is not None and response.status_code == 200:
+            self.token = response.json()["access_token"]
+
+    async def classify_text(self):
+        await self.request("POST /content/classify-text", "POST", "/content/classify-text",
+                           json={"text": self.rng.choice(TEXTS)})
+
+    async def classify_image(self):
+        await self.request("POST /content/classify-image", "POST", "/content/classify-image",
+                           files={"file": ("load.png", self.image, "image/png")})
+
+    async def check_blood(self):
+        await self.request("POST /content/check-blood", "POST", "/content/check-blood",
+                           files={"file": ("load.png", self.image, "image/png")})
+
+    async def neutralize(self):
+        await self.request("POST /generate/neutralize", "POST", "/generate/neutralize",
+                           json={"text": self.rng.choice(TEXTS)})
+
+    async def generate_image(self):
+        await self.request("POST /content/generate-image", "POST", "/content/generate-image",
+                           json={"prompt": self.rng.choice(PROMPTS)})
+
+    async def user_content(self):
+        await self.request("GET /content/user-content", "GET", "/content/user-content")
+
+
+STEPS = {"login", "classify_text", "classify_image", "check_blood", "neutralize", "generate_image", "user_content"}
+
+
+def load_scenario(value: str) -> List[str]:
+    if value.endswith(".json"):
+        with open(value) as f:
+            steps = []
+            for item in json.load(f):
+                if isinstance(item, str):
+                    item = {"step": item}
+                steps.extend([item["step"]] * int(item.get("repeat", 1)))
+    else:
+        steps = [step.strip() for step in value.split(",") if step.strip()]
+    unknown = [step for step in steps if step not in STEPS]
+    if unknown:
+        raise SystemExit(f"Unknown scenario steps: {', '.join(unknown)}")
+    return steps
+
+
+async def run(base_url: str, users: int, duration: float, scenario: List[str], ramp_up: float, timeout: float):
+    import httpx
+
+    recorder = Recorder()
+    image = synthetic_png()
+    limits = httpx.Limits(max_connections=users * 2, max_keepalive_connections=users * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        deadline = time.perf_counter() + duration
+
+        async def user_loop(index: int):
+            await asyncio.sleep(ramp_up * index / max(users, 1))
+            user = VirtualUser(client, recorder, index, image)
+            await user.signup()
+            await user.login()
+            while time.perf_counter() < deadline:
+                for step in scenario:
+                    if time.perf_counter() >= deadline:
+                        break
+                    await getattr(user, step)()
+
+        start = time.perf_counter()
+        await asyncio.gather(*[user_loop(i) for i in range(users)])
+        elapsed = time.perf_counter() - start
+    return recorder.report(elapsed), elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=10, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to run")
+    parser.add_argument("--ramp-up", type=float, default=5, help="Seconds to start all users")
+    parser.add_argument("--timeout", type=float, default=150, help="Per-request timeout")
+    parser.add_argument("--scenario", default="login,classify_text,neutralize,generate_image",
+                        help="Comma separated steps or a JSON scenario file")
+    parser.add_argument("--output", help="Write the per-endpoint report as JSON")
+    args = parser.parse_args(argv)
+
+    scenario = load_scenario(args.scenario)
+    rows, elapsed = asyncio.run(run(args.base_url, args.users, args.duration, scenario, args.ramp_up, args.timeout))
+
+    print(f"{args.users} users, {elapsed:.1f}s, scenario: {' -> '.join(scenario)}")
+    print(f"{'endpoint':<32} {'reqs':>6} {'errs':>5} {'rps':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for row in rows:
+        print(f"{row['endpoint']:<32} {row['requests']:>6} {row['errors']:>5} {row['rps']:>7.1f} "
+              f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"users": args.users, "elapsed": elapsed, "scenario": scenario, "endpoints": rows}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
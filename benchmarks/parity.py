@@ -0,0 +1,78 @@
+"""
+Parity check for the fast image preprocessing path
+
+Compares load_models.fast_pixel_values against the HF image processor on
+synthetic images and exits 1 when they disagree beyond the tolerance. The
+reduced-scale JPEG decode is reported separately with its own (looser)
+tolerance, since DCT-domain downscaling legitimately changes pixel values.
+
+Usage:
+    python -m benchmarks.parity
+    python -m benchmarks.parity --image-size 224 --tolerance 1e-5 --jpeg-tolerance 0.1
+"""
+import os
+import sys
+import argparse
+import tempfile
+
+
+def compare_images(processor, paths, reduced_decode: bool):
+    """Return [(path, max_abs_diff, mean_abs_diff)] of fast vs processor pixel values"""
+    from PIL import Image
+    from app import load_models
+
+    spec = load_models._preprocess_spec(processor)
+    if spec is None:
+        raise SystemExit(f"{type(processor).__name__} has no fast preprocessing path")
+
+    rows = []
+    for path in paths:
+        with Image.open(path) as image:
+            reference = processor(images=image.convert("RGB"), return_tensors="pt")["pixel_values"]
+        if reduced_decode:
+            image = load_models.open_image_reduced(path, processor)
+        else:
+            image = Image.open(path).convert("RGB")
+        fast = load_models.fast_pixel_values(spec, image)
+        diff = (fast - reference).abs()
+        rows.append((path, float(diff.max()), float(diff.mean())))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image-size", type=int, default=224, help="Processor target size")
+    parser.add_argument("--tolerance", type=float, default=1e-5, help="Max abs diff, full decode")
+    parser.add_argument("--jpeg-tolerance", type=float, default=0.1, help="Mean abs diff, reduced JPEG decode")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.getcwd())
+    from benchmarks import fixtures
+    fixtures.offline_environment()
+    os.environ["FAST_IMAGE_PREPROCESS"] = "true"
+
+    from transformers import ViTImageProcessor
+
+    processor = ViTImageProcessor(size={"height": args.image_size, "width": args.image_size})
+    failed = False
+    with tempfile.TemporaryDirectory(prefix="sawtna-parity-") as workdir:
+        paths = fixtures.synthetic_images(workdir, sizes=((640, 480), (1280, 960), (333, 1000)), count=6)
+
+        print("full decode (max abs diff):")
+        for path, max_diff, mean_diff in compare_images(processor, paths, reduced_decode=False):
+            ok = max_diff <= args.tolerance
+            failed |= not ok
+            print(f"  {os.path.basename(path):<20} max {max_diff:.2e}  mean {mean_diff:.2e}  {'ok' if ok else 'FAIL'}")
+
+        print("reduced JPEG decode (mean abs diff):")
+        jpegs = [path for path in paths if path.endswith(".jpg")]
+        for path, max_diff, mean_diff in compare_images(processor, jpegs, reduced_decode=True):
+            ok = mean_diff <= args.jpeg_tolerance
+            failed |= not ok
+            print(f"  {os.path.basename(path):<20} max {max_diff:.2e}  mean {mean_diff:.2e}  {'ok' if ok else 'FAIL'}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
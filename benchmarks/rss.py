@@ -0,0 +1,110 @@
+"""
+Worker memory with private vs memory-mapped model weights
+
+Starts 1..N worker processes that each load the same safetensors file,
+either as a private copy (safetensors.torch.load_file, like from_pretrained)
+or mmap'd through app.model_store, run a pass over every weight, and then
+report RSS, PSS and USS from /proc/self/smaps_rollup while all workers are
+alive. Expect RSS per worker to stay flat in both modes; total PSS grows by
+one copy of the weights per worker with private copies, and only by the
+per-process overhead with mmap. Linux only.
+
+By default a synthetic weight file is generated; pass --weights to measure a
+real converted checkpoint (e.g. app/models/text_classifier/model.safetensors).
+
+Usage:
+    python -m benchmarks.rss --workers 4 --size-mb 512
+    python -m benchmarks.rss --workers 4 --weights app/models/sam_vit_b_01ec64.safetensors
+"""
+import os
+import sys
+import argparse
+import tempfile
+import multiprocessing as mp
+
+
+def memory_kb() -> dict:
+    """Rss/Pss/Private_* of this process in kB"""
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                values[parts[0][:-1]] = int(parts[1])
+    values["Uss"] = values.get("Private_Clean", 0) + values.get("Private_Dirty", 0)
+    return values
+
+
+def worker(path: str, mode: str, loaded, release, results):
+    if mode == "mmap":
+        from app.model_store import mmap_state_dict
+        state_dict = mmap_state_dict(path)
+    else:
+        from safetensors.torch import load_file
+        state_dict = load_file(path)
+
+    # Touch every page the way a forward pass would
+    checksum = 0.0
+    for tensor in state_dict.values():
+        if tensor.is_floating_point():
+            checksum += float(tensor.sum())
+    loaded.wait()
+    results.put(memory_kb())
+    release.wait()
+
+
+def measure(path: str, mode: str, workers: int) -> dict:
+    ctx = mp.get_context("spawn")
+    loaded = ctx.Barrier(workers)
+    release = ctx.Barrier(workers + 1)
+    results = ctx.Queue()
+    processes = [ctx.Process(target=worker, args=(path, mode, loaded, release, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    samples = [results.get() for _ in range(workers)]
+    release.wait()
+    for process in processes:
+        process.join()
+    return {
+        "mode": mode,
+        "workers": workers,
+        "rss_mb": sum(s["Rss"] for s in samples) / workers / 1024,
+        "uss_mb": sum(s["Uss"] for s in samples) / workers / 1024,
+        "total_pss_mb": sum(s["Pss"] for s in samples) / 1024,
+    }
+
+
+def synthetic_weights(directory: str, size_mb: int) -> str:
+    import torch
+    from safetensors.torch import save_file
+
+    path = os.path.join(directory, "synthetic.safetensors")
+    elements = size_mb * 1024 * 1024 // 4
+    chunk = 1024 * 1024
+    save_file({f"layer_{i}.weight": torch.randn(chunk) for i in range(max(1, elements // chunk))}, path)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4, help="Measure 1..N workers")
+    parser.add_argument("--size-mb", type=int, default=256, help="Synthetic weight file size")
+    parser.add_argument("--weights", help="Existing safetensors file to load instead")
+    parser.add_argument("--modes", nargs="*", default=["copy", "mmap"], choices=["copy", "mmap"])
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.getcwd())
+    with tempfile.TemporaryDirectory(prefix="sawtna-rss-") as workdir:
+        path = args.weights or synthetic_weights(workdir, args.size_mb)
+        print(f"weights: {path} ({os.path.getsize(path) / 1024 / 1024:.0f} MB)")
+        print(f"{'mode':<6} {'workers':>7} {'RSS/worker':>11} {'USS/worker':>11} {'total PSS':>10}")
+        for mode in args.modes:
+            for workers in range(1, args.workers + 1):
+                row = measure(path, mode, workers)
+                print(f"{row['mode']:<6} {row['workers']:>7} {row['rss_mb']:>9.0f}MB "
+                      f"{row['uss_mb']:>9.0f}MB {row['total_pss_mb']:>8.0f}MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())